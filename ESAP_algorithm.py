@@ -1,20 +1,34 @@
-from typing import List, Dict, Tuple, Optional, Any, Callable
-from dataclasses import dataclass
+from typing import List, Dict, Tuple, Optional, Callable
+from array import array
 
-@dataclass
-class BoardCoordinate:
-    """Represents a position on the chess board"""
-    row: int
-    col: int
-    
-    def __iter__(self):
-        """Allow unpacking like a tuple"""
-        yield self.row
-        yield self.col
-        
-    def is_valid(self) -> bool:
-        """Check if position is within board boundaries"""
-        return 0 <= self.row < 8 and 0 <= self.col < 8
+import ESAP_movegen
+from ESAP_chess_core import BoardCoordinate, coord_to_sq, PIECE_CODES, PIECE_INDEX  # BoardCoordinate for callers working in rows and columns
+from ESAP_bitboards import (MASK_64, rook_attacks, bishop_attacks, queen_attacks, BETWEEN, LINE,
+                            KNIGHT_ATTACKS, KING_ATTACKS, WHITE_PAWN_ATTACKS, BLACK_PAWN_ATTACKS,
+                            ZOBRIST_PIECE_SQ, ZOBRIST_SIDE, ZOBRIST_EP)
+from ESAP_movegen import pack_move, board_to_flat, FLAG_ENPASSANT, FLAT_CODES
+
+# bitboard order for the 12 piece types is PIECE_CODES / PIECE_INDEX from ESAP_chess_core
+# square index is row * 8 + col, so bit 0 is a8 and bit 63 is h1
+# (flat board codes from ESAP_movegen are these indexes plus one, 0 is an empty square)
+# piece string for each flat code, so reading the flat board back out is a single index
+FLAT_TO_STR = ("--",) + PIECE_CODES
+# flat codes the hot paths compare against, looked up once here instead of on every move
+WHITE_PAWN = FLAT_CODES["wp"]
+BLACK_PAWN = FLAT_CODES["bp"]
+WHITE_KING = FLAT_CODES["wK"]
+BLACK_KING = FLAT_CODES["bK"]
+# deepest search ply that gets its own move buffer
+MAX_PLY = 64
+
+
+# transposition table entries (a power of two so the index is key & (TT_SIZE - 1))
+TT_SIZE = 1 << 16
+
+# file and row masks for whole-board pawn shifts
+FILE_A_BB = sum(1 << (r * 8) for r in range(8))
+FILE_H_BB = FILE_A_BB << 7
+ROW_BB = [0xFF << (r * 8) for r in range(8)]
 
 
 class GameState:
@@ -41,70 +55,197 @@ class GameState:
     
     def __init__(self):
         """Initialize a new chess game state"""
-        # copy the initial board setup
-        self.board: List[List[str]] = [
-            row[:] for row in self.INITIAL_BOARD
-        ]
-        
-        # map piece types to their move generation methods
-        self.moveFunctions: Dict[str, Callable] = {
-            'p': self.generate_pawn_moves,
-            'R': self.generate_rook_moves,
-            'N': self.generate_knight_moves,
-            'B': self.generate_bishop_moves,
-            'Q': self.generate_queen_moves,
-            'K': self.generate_king_moves
-        }
+        # one bitboard per piece type plus occupancy masks, these drive move generation
+        self.piece_bb: List[int] = [0] * 12
+        for r in range(8):
+            for c in range(8):
+                piece = self.INITIAL_BOARD[r][c]
+                if piece != self.NULL_SQUARE:
+                    self.piece_bb[PIECE_INDEX[piece]] |= 1 << (r * 8 + c)
+        self.occ_white: int = 0
+        self.occ_black: int = 0
+        for index in range(6):
+            self.occ_white |= self.piece_bb[index]
+            self.occ_black |= self.piece_bb[index + 6]
+        self.occ_all: int = self.occ_white | self.occ_black
+        
+        # flat 64-square board (piece on each square) for ESAP_movegen and for filling in packed moves
+        self.board_flat: bytearray = board_to_flat(self.INITIAL_BOARD)
+        
+        # one preallocated move buffer per search ply, so generating moves never allocates
+        self.move_stack: List[array] = [array("I", [0]) * ESAP_movegen.MAX_MOVES for _ in range(MAX_PLY)]
+        
+        # move generation method for each flat board code, so dispatch is one tuple index
+        # (pawns are generated all at once and empty squares are never visited, so those slots are None)
+        piece_functions = (None,
+                           self.generate_rook_moves,
+                           self.generate_knight_moves,
+                           self.generate_bishop_moves,
+                           self.generate_queen_moves,
+                           self.generate_king_moves)
+        self.moveFunctions: Tuple[Optional[Callable], ...] = (None,) + piece_functions * 2
         
         # game state tracking
         self.white_to_move: bool = True  # white moves first
-        self.move_log: List[Any] = []   # history of moves
+        self.move_log: List[int] = []   # history of packed moves
         
         # track king positions for check detection
-        self.white_king_location: Tuple[int, int] = (7, 4)
-        self.black_king_location: Tuple[int, int] = (0, 4)
+        self.white_king_sq: int = coord_to_sq(7, 4)
+        self.black_king_sq: int = coord_to_sq(0, 4)
         
         # game ending states
         self.check_mate: bool = False
         self.stale_mate: bool = False
         
         # special move tracking
-        self.enpassant_possible: Tuple[int, int] = ()  # empty tuple means no en passant possible
+        self.enpassant_sq: int = -1  # square a pawn can capture en passant onto, -1 means none
+        
+        # position hash, kept up to date by execute_move, plus what revert_move needs to restore it
+        self.zobrist_key: int = self.compute_zobrist_key()
+        self.state_log: List[Tuple[int, int]] = []  # (zobrist key, en passant square) before each move
+        
+        # transposition table of legal moves by position, the full key is stored to catch index collisions
+        self.tt_keys: List[int] = [0] * TT_SIZE
+        self.tt_moves: List[Optional[Tuple[int, ...]]] = [None] * TT_SIZE
+        self.tt_in_check: List[bool] = [False] * TT_SIZE  # so a hit can still tell mate from stalemate
 
-    def execute_move(self, move) -> None:
-        """Execute a move on the board and update game state
+    def compute_zobrist_key(self) -> int:
+        """Hash the current position from scratch (execute_move updates it incrementally)
+        
+        Returns:
+            int: 64-bit zobrist key
+        """
+        key = 0
+        for sq, code in enumerate(self.board_flat):
+            key ^= ZOBRIST_PIECE_SQ[code][sq]
+        if not self.white_to_move:
+            key ^= ZOBRIST_SIDE
+        if self.enpassant_sq >= 0:
+            key ^= ZOBRIST_EP[self.enpassant_sq & 7]
+        return key
+
+    @property
+    def board(self) -> List[List[str]]:
+        """8x8 grid of piece codes like the old mailbox, rebuilt on demand for UI/display code only
+        
+        Returns:
+            list: rows of two-character piece codes, NULL_SQUARE for empty squares
+        """
+        names = [FLAT_TO_STR[code] for code in self.board_flat]
+        return [names[r * 8:r * 8 + 8] for r in range(8)]
+
+    def board_str(self, r: int, c: int) -> str:
+        """Get the two-character piece code on a square (display only)
+        
+        Args:
+            r: Row of the square
+            c: Column of the square
+            
+        Returns:
+            str: piece code like "wK", or NULL_SQUARE if the square is empty
+        """
+        return FLAT_TO_STR[self.board_flat[coord_to_sq(r, c)]]
+
+    def _apply_bb(self, move: int) -> None:
+        """XOR a move into the bitboards and occupancy masks (nothing else is touched)
         
         Args:
-            move: The move to execute
+            move: The packed move to apply
         """
-        # update the board by moving the piece
-        self.board[move.startRow][move.startCol] = self.NULL_SQUARE
-        self.board[move.endRow][move.endCol] = move.pieceMoved
+        start_sq = move & 63
+        end_sq = (move >> 6) & 63
+        from_to = (1 << start_sq) | (1 << end_sq)
+        moved = (move >> 24) - 1
+        piece_bb = self.piece_bb
+        
+        # move the piece on its bitboard and on the mover's occupancy
+        piece_bb[moved] ^= from_to
+        white_moved = moved < 6
+        if white_moved:
+            self.occ_white ^= from_to
+        else:
+            self.occ_black ^= from_to
         
-        # record the move in the log
+        # take the captured piece off its bitboard (en passant captures beside the end square)
+        captured = (move >> 20) & 15
+        if captured:
+            if (move >> 12) & FLAG_ENPASSANT:
+                capture_bb = 1 << ((start_sq & ~7) | (end_sq & 7))
+            else:
+                capture_bb = 1 << end_sq
+            piece_bb[captured - 1] ^= capture_bb
+            if white_moved:
+                self.occ_black ^= capture_bb
+            else:
+                self.occ_white ^= capture_bb
+        
+        # pawn promotion swaps the pawn on the end square for the promoted piece
+        promo = (move >> 16) & 15
+        if promo:
+            piece_bb[moved] ^= 1 << end_sq
+            piece_bb[promo - 1] ^= 1 << end_sq
+        self.occ_all = self.occ_white | self.occ_black
+    
+    # every update above is an XOR, so applying the same move again takes it back
+    _revert_bb = _apply_bb
+
+    def execute_move(self, move: int) -> None:
+        """Execute a move on the board and update game state
+        
+        Args:
+            move: The packed move to execute
+        """
+        start_sq = move & 63
+        end_sq = (move >> 6) & 63
+        moved = move >> 24
+        captured = (move >> 20) & 15
+        is_enpassant = (move >> 12) & FLAG_ENPASSANT
+        board_flat = self.board_flat
+        old_ep_sq = self.enpassant_sq
+        
+        # update the bitboards
+        self._apply_bb(move)
+        
+        # keep the flat board in sync
+        landed = (move >> 16) & 15 or moved
+        board_flat[start_sq] = 0
+        board_flat[end_sq] = landed
+        if is_enpassant:
+            board_flat[(start_sq & ~7) | (end_sq & 7)] = 0  # capture the pawn
+        
+        # record the move in the log, with the hash and en passant square to go back to
         self.move_log.append(move)
+        self.state_log.append((self.zobrist_key, old_ep_sq))
         
         # switch turns
         self.white_to_move = not self.white_to_move
         
         # update king position tracking if a king moved
-        if move.pieceMoved == f"{self.white}K":
-            self.white_king_location = (move.endRow, move.endCol)
-        elif move.pieceMoved == f"{self.black}K":
-            self.black_king_location = (move.endRow, move.endCol)
+        if moved == WHITE_KING:
+            self.white_king_sq = end_sq
+        elif moved == BLACK_KING:
+            self.black_king_sq = end_sq
 
-        # handle en passant capture
-        if move.isEnpassantMove:
-            print("En passant capture executed")
-            self.board[move.startRow][move.endCol] = self.NULL_SQUARE  # Capture the pawn
-            
         # update en passant possibility
-        if move.pieceMoved[1] == 'p' and abs(move.startRow - move.endRow) == 2:
+        if (moved == WHITE_PAWN or moved == BLACK_PAWN) and abs(start_sq - end_sq) == 16:
             # a pawn moved two squares, enabling en passant on the next move
-            self.enpassant_possible = ((move.startRow + move.endRow) // 2, move.endCol)
+            new_ep_sq = (start_sq + end_sq) // 2
         else:
             # reset en passant possibility
-            self.enpassant_possible = ()
+            new_ep_sq = -1
+        self.enpassant_sq = new_ep_sq
+        
+        # update the hash: pieces that left or landed on a square, the side to move and the en passant file
+        key = self.zobrist_key ^ ZOBRIST_SIDE
+        key ^= ZOBRIST_PIECE_SQ[moved][start_sq] ^ ZOBRIST_PIECE_SQ[landed][end_sq]
+        if captured:
+            capture_sq = (start_sq & ~7) | (end_sq & 7) if is_enpassant else end_sq
+            key ^= ZOBRIST_PIECE_SQ[captured][capture_sq]
+        if old_ep_sq >= 0:
+            key ^= ZOBRIST_EP[old_ep_sq & 7]
+        if new_ep_sq >= 0:
+            key ^= ZOBRIST_EP[new_ep_sq & 7]
+        self.zobrist_key = key
 
     def revert_move(self) -> bool:
         """Undo the last move and restore the previous game state
@@ -118,81 +259,157 @@ class GameState:
             
         # get the last move from the log and remove it
         move = self.move_log.pop()
-        
-        # restore the board state
-        self.board[move.start_row][move.start_col] = move.piece_moved
-        self.board[move.end_row][move.end_col] = move.piece_captured
+        start_sq = move & 63
+        end_sq = (move >> 6) & 63
+        moved = move >> 24
+        captured = (move >> 20) & 15
+        board_flat = self.board_flat
         
         # switch back to the previous player's turn
         self.white_to_move = not self.white_to_move
         
+        # restore the bitboards
+        self._revert_bb(move)
+        
+        # restore the flat board (en passant puts the pawn back beside the empty end square)
+        board_flat[start_sq] = moved
+        if (move >> 12) & FLAG_ENPASSANT:
+            board_flat[end_sq] = 0
+            board_flat[(start_sq & ~7) | (end_sq & 7)] = captured
+        else:
+            board_flat[end_sq] = captured
+        
         # update king position tracking if a king was moved
-        if move.piece_moved == f"{self.white}K":
-            self.white_king_location = (move.start_row, move.start_col)
-        elif move.piece_moved == f"{self.black}K":
-            self.black_king_location = (move.start_row, move.start_col)
+        if moved == WHITE_KING:
+            self.white_king_sq = start_sq
+        elif moved == BLACK_KING:
+            self.black_king_sq = start_sq
 
-        # handle en passant move reversal
-        if move.is_enpassant_move:
-            # clear the destination square
-            self.board[move.end_row][move.end_col] = self.empty_square
-            # restore the captured pawn
-            self.board[move.start_row][move.end_col] = move.piece_captured
-            # set the en passant possible square
-            self.enpassant_possible = (move.end_row, move.end_col)
-
-        # reset en passant possibility for two-square pawn moves
-        if move.piece_moved[1] == 'p' and abs(move.start_row - move.end_row) == 2:
-            self.enpassant_possible = ()
+        # restore the hash and the en passant square from before the move
+        self.zobrist_key, self.enpassant_sq = self.state_log.pop()
             
         return True
 
-    def fetch_legal_moves(self):
+    def fetch_legal_moves(self, ply: int = 0) -> List[int]:
         """Get all valid moves for the current player, considering check rules
         
+        Args:
+            ply: Search ply whose move buffer the candidate moves go into
+            
         Returns:
-            list: list of valid Move objects
+            list: list of valid packed moves
         """
-        # save current en passant state
-        temp_enpassant_possible = self.enpassant_possible
+        # a position seen before gets its legal moves straight from the transposition table
+        key = self.zobrist_key
+        index = key & (TT_SIZE - 1)
+        if self.tt_keys[index] == key and self.tt_moves[index] is not None:
+            legal_moves = list(self.tt_moves[index])
+            self._update_end_state(legal_moves, self.tt_in_check[index])
+            return legal_moves
         
         # get all possible moves without considering check
-        candidate_moves = self.get_all_possible_moves()
+        buf = self.move_stack[ply]
+        count = self.get_all_possible_moves(ply)
+        
+        # our king square and who attacks it
+        king_sq = self.white_king_sq if self.white_to_move else self.black_king_sq
+        king_code = WHITE_KING if self.white_to_move else BLACK_KING
+        by_white = not self.white_to_move
+        
+        # work out checks and pins once, then most moves are judged with a couple of masks
+        checkers, pinned, pin_rays = self.compute_pins_and_checkers(king_sq)
+        if checkers & (checkers - 1):
+            check_mask = 0  # double check, only the king can move
+        elif checkers:
+            check_mask = checkers | BETWEEN[king_sq][checkers.bit_length() - 1]  # capture or block
+        else:
+            check_mask = MASK_64
+        
+        # the king can't hide behind itself on a slider's ray
+        occ_without_king = self.occ_all ^ (1 << king_sq)
         
-        # filter out moves that would leave the king in check
-        # iterate backwards to safely remove items during iteration
-        for i in range(len(candidate_moves)-1, -1, -1):
-            # try the move
-            self.make_move(candidate_moves[i])
+        # bound methods as locals so the loop doesn't look them up on every move
+        is_square_attacked = self.is_square_attacked
+        
+        # keep only moves that don't leave the king in check (one forward pass, no list.remove)
+        legal_moves = []
+        legal_append = legal_moves.append
+        for i in range(count):
+            move = buf[i]
+            start_sq = move & 63
+            end_sq = (move >> 6) & 63
             
-            # switch perspective to opponent to check if they can capture our king
-            self.white_to_move = not self.white_to_move
+            if move >> 24 == king_code:
+                # the king must land on a square the enemy doesn't attack
+                if not is_square_attacked(end_sq, by_white, occ_without_king):
+                    legal_append(move)
+            elif (move >> 12) & FLAG_ENPASSANT:
+                # en passant takes two pawns off one rank at once, so just try it on the bitboards
+                self._apply_bb(move)
+                if not is_square_attacked(king_sq, by_white):
+                    legal_append(move)
+                self._revert_bb(move)
+            elif (check_mask >> end_sq) & 1 and (not (pinned >> start_sq) & 1 or (pin_rays[start_sq] >> end_sq) & 1):
+                # answers any check and a pinned piece stays on its pin line
+                legal_append(move)
+        
+        # remember this position's moves
+        self.tt_keys[index] = key
+        self.tt_moves[index] = tuple(legal_moves)
+        
+        # the checkers bitboard already says whether we're in check
+        in_check = checkers != 0
+        self.tt_in_check[index] = in_check
+        self._update_end_state(legal_moves, in_check)
+        return legal_moves
+
+    def perft(self, depth: int, ply: int = 0) -> int:
+        """Count the leaf positions of the legal move tree, for checking and timing move generation
+        
+        Leaf moves are counted without being made, and every ply uses its own move buffer.
+        
+        Args:
+            depth: How many plies deep to count
+            ply: Search ply of the current position (picks the move buffer)
             
-            # if this move leaves us in check, remove it from valid moves
-            if self.is_in_check():
-                candidate_moves.remove(candidate_moves[i])
-                
-            # undo the move and restore turn
-            self.undo_move()
-            self.white_to_move = not self.white_to_move
+        Returns:
+            int: number of positions reached after exactly depth plies
+        """
+        if depth == 0:
+            return 1
+        legal_moves = self.fetch_legal_moves(ply)
+        if depth == 1:
+            return len(legal_moves)
+        
+        nodes = 0
+        for move in legal_moves:
+            self.execute_move(move)
+            nodes += self.perft(depth - 1, ply + 1)
+            self.revert_move()
+        return nodes
+
+    def _update_end_state(self, legal_moves: List[int], in_check: Optional[bool] = None) -> None:
+        """Set the checkmate and stalemate flags from the current player's legal moves
+        
+        Nothing is printed, callers read self.check_mate / self.stale_mate.
         
+        Args:
+            legal_moves: every legal move in the current position
+            in_check: whether the current player is in check, worked out here if not given
+        """
         # check for checkmate or stalemate
-        if not candidate_moves:  # no valid moves left
-            if self.is_in_check():
+        if not legal_moves:  # no valid moves left
+            if in_check is None:
+                in_check = self.is_in_check()
+            if in_check:
                 self.check_mate = True
-                print("Checkmate.")
             else:
                 self.stale_mate = True
-                print("Stalemate.")
         else:
             # reset game ending flags if moves are available
             self.check_mate = False
             self.stale_mate = False
 
-        # restore the original en passant state
-        self.enpassant_possible = temp_enpassant_possible
-        return candidate_moves
-
     def is_in_check(self) -> bool:
         """Determine if the current player's king is in check
         
@@ -200,13 +417,13 @@ class GameState:
             bool: True if the current player is in check, False otherwise
         """
         # get the position of the current player's king
-        king_position = self.white_king_location if self.white_to_move else self.black_king_location
+        king_sq = self.white_king_sq if self.white_to_move else self.black_king_sq
         
-        # check if the king's position is under attack by any opponent piece
-        return self.is_square_under_attack(king_position[0], king_position[1])
+        # check if the king's square is under attack by any opponent piece
+        return self.is_square_attacked(king_sq, not self.white_to_move)
 
     def is_square_under_attack(self, r: int, c: int) -> bool:
-        """D etermine if a specific square is under attack by opponent pieces
+        """Determine if a specific square is under attack by opponent pieces
         
         Args:
             r: Row of the square to check
@@ -215,221 +432,301 @@ class GameState:
         Returns:
             bool: True if the square is under attack, False otherwise
         """
-        # Temporarily switch turns to get opponent's perspective
-        self.white_to_move = not self.white_to_move
+        return self.is_square_attacked(coord_to_sq(r, c), not self.white_to_move)
+
+    def compute_pins_and_checkers(self, king_sq: int) -> Tuple[int, int, Dict[int, int]]:
+        """Find the enemy pieces giving check and our pieces pinned to the king
         
-        # Get all possible moves for the opponent
-        opponent_moves = self.get_all_possible_moves()
+        Args:
+            king_sq: Square index of the current player's king
+            
+        Returns:
+            tuple: (checkers bitboard, pinned bitboard, {pinned square: line it may move along})
+        """
+        piece_bb = self.piece_bb
+        occ_all = self.occ_all
+        if self.white_to_move:
+            enemy, own_occ, enemy_occ = 6, self.occ_white, self.occ_black
+        else:
+            enemy, own_occ, enemy_occ = 0, self.occ_black, self.occ_white
+        enemy_diagonal = piece_bb[enemy + 3] | piece_bb[enemy + 4]
+        enemy_straight = piece_bb[enemy + 1] | piece_bb[enemy + 4]
+        
+        # pieces attacking the king right now
+        checkers = self.attackers_to(king_sq, not self.white_to_move)
+        
+        # sliders that would hit the king if only enemy pieces blocked, a lone own piece in between is pinned
+        snipers = ((bishop_attacks(king_sq, enemy_occ) & enemy_diagonal)
+                   | (rook_attacks(king_sq, enemy_occ) & enemy_straight))
+        pinned = 0
+        pin_rays = {}
+        while snipers:
+            lsb = snipers & -snipers
+            sniper_sq = lsb.bit_length() - 1
+            snipers ^= lsb
+            blockers = BETWEEN[king_sq][sniper_sq] & occ_all
+            if blockers and not blockers & (blockers - 1) and blockers & own_occ:
+                pinned |= blockers
+                pin_rays[blockers.bit_length() - 1] = LINE[king_sq][sniper_sq]
+        return checkers, pinned, pin_rays
+
+    def attackers_to(self, sq: int, by_white: bool, occ: Optional[int] = None) -> int:
+        """Find every piece of one side that attacks a square
         
-        # Switch back to original player
-        self.white_to_move = not self.white_to_move
+        Args:
+            sq: Square index (row * 8 + col) to check
+            by_white: True to look for white attackers, False for black
+            occ: Occupancy to trace sliders through, defaults to the real board
+            
+        Returns:
+            int: bitboard of the attacking pieces
+        """
+        piece_bb = self.piece_bb
+        offset = 0 if by_white else 6
+        occ_all = self.occ_all if occ is None else occ
+        queens = piece_bb[offset + 4]
+        # a white pawn attacks sq if a black pawn on sq would attack it (and vice versa)
+        pawn_attacks = BLACK_PAWN_ATTACKS if by_white else WHITE_PAWN_ATTACKS
+        return ((pawn_attacks[sq] & piece_bb[offset])
+                | (KNIGHT_ATTACKS[sq] & piece_bb[offset + 2])
+                | (bishop_attacks(sq, occ_all) & (piece_bb[offset + 3] | queens))
+                | (rook_attacks(sq, occ_all) & (piece_bb[offset + 1] | queens))
+                | (KING_ATTACKS[sq] & piece_bb[offset + 5]))
+
+    def is_square_attacked(self, sq: int, by_white: bool, occ: Optional[int] = None) -> bool:
+        """Determine if a square is attacked by one side without generating its moves
         
-        # Check if any opponent move targets the specified square
-        for move in opponent_moves:
-            if move.end_row == r and move.end_col == c:
-                return True
-                
-        return False
+        Puts a "superpiece" on the square and intersects its attacks with the
+        attacker's bitboards, cheapest and most common attackers first, stopping
+        at the first hit (attackers_to gives the full set).
+        
+        Args:
+            sq: Square index (row * 8 + col) to check
+            by_white: True to look for white attackers, False for black
+            occ: Occupancy to trace sliders through, defaults to the real board
+            
+        Returns:
+            bool: True if any attacker hits the square, False otherwise
+        """
+        piece_bb = self.piece_bb
+        offset = 0 if by_white else 6
+        
+        # a white pawn attacks sq if a black pawn on sq would attack it (and vice versa)
+        pawn_attacks = BLACK_PAWN_ATTACKS if by_white else WHITE_PAWN_ATTACKS
+        if pawn_attacks[sq] & piece_bb[offset]:
+            return True
+        if KNIGHT_ATTACKS[sq] & piece_bb[offset + 2]:
+            return True
+        
+        occ_all = self.occ_all if occ is None else occ
+        queens = piece_bb[offset + 4]
+        if bishop_attacks(sq, occ_all) & (piece_bb[offset + 3] | queens):
+            return True
+        if rook_attacks(sq, occ_all) & (piece_bb[offset + 1] | queens):
+            return True
+        return bool(KING_ATTACKS[sq] & piece_bb[offset + 5])
 
-    def get_all_possible_moves(self) -> list:
+    def get_all_possible_moves(self, ply: int = 0) -> int:
         """Generate all possible moves for the current player without considering check
         
+        Args:
+            ply: Search ply whose move buffer (self.move_stack[ply]) the moves are written into
+            
         Returns:
-            list: List of all possible Move objects
+            int: number of packed moves written to the buffer
         """
-        moves = []
-        
-        # iterate through all squares on the board
-        for r in range(8):
-            for c in range(8):
-                # get the piece color at current square
-                piece_color = self.board[r][c][0]
-                
-                # check if the piece belongs to the current player
-                if ((piece_color == self.white and self.white_to_move) or 
-                    (piece_color == self.black and not self.white_to_move)):
-                    
-                    # get the piece type (p, R, N, B, Q, K)
-                    piece_type = self.board[r][c][1]
-                    
-                    # call the appropriate move generation function for this piece type
-                    self.move_functions[piece_type](r, c, moves)
+        buf = self.move_stack[ply]
+        
+        # with numba the whole board is one compiled loop writing packed moves into the buffer
+        if ESAP_movegen.NUMBA_AVAILABLE:
+            return ESAP_movegen.gen_all_moves(self.board_flat, self.white_to_move, self.enpassant_sq, buf)
+        
+        # otherwise the bitboard generators below are faster than the kernels as plain Python
+        n = 0
+        own_occ = self.occ_white if self.white_to_move else self.occ_black
+        board_flat = self.board_flat
+        move_functions = self.moveFunctions
+        
+        # all pawns in one go, then visit only the squares holding the other pieces
+        n = self.generate_pawn_moves(buf, n)
+        pawns = self.piece_bb[PIECE_INDEX["wp"] if self.white_to_move else PIECE_INDEX["bp"]]
+        pieces = own_occ & ~pawns
+        while pieces:
+            # pop the lowest piece
+            lsb = pieces & -pieces
+            sq = lsb.bit_length() - 1
+            pieces ^= lsb
+            
+            # call the move generation function for the piece on this square
+            n = move_functions[board_flat[sq]](sq, buf, n)
                     
-        return moves
+        return n
 
-    def generate_pawn_moves(self, r: int, c: int, moves: list) -> None:
-        """Generate all possible pawn moves from the given position
+    def generate_pawn_moves(self, buf: array, n: int) -> int:
+        """Generate the moves of every pawn of the current player at once
+        
+        Pushes and captures for all pawns come from shifting the whole pawn
+        bitboard, so the work doesn't grow with the number of pawns.
         
         Args:
-            r: Row of the pawn
-            c: Column of the pawn
-            moves: List to append valid moves to
+            buf: Move buffer to write into
+            n: Number of moves already in buf
+            
+        Returns:
+            int: the new number of moves in buf
         """
-        if self.white_to_move:  # white pawn moves (upward on the board)
-            # forward move - one square
-            if self.board[r-1][c] == self.empty_square:
-                moves.append(Move((r, c), (r-1, c), self.board))
-                # forward move - two squares from starting position
-                if r == 6 and self.board[r-2][c] == self.empty_square:
-                    moves.append(Move((r, c), (r-2, c), self.board))
-                    
-            # capture moves - diagonal left
-            if c-1 >= 0:  # check left boundary
-                if self.board[r-1][c-1][0] == self.black:  # regular capture
-                    moves.append(Move((r, c), (r-1, c-1), self.board))
-                elif (r-1, c-1) == self.enpassant_possible:  # en passant capture
-                    moves.append(Move((r, c), (r-1, c-1), self.board, is_enpassant_move=True))
-                    
-            # capture moves - diagonal right
-            if c+1 <= 7:  # check right boundary
-                if self.board[r-1][c+1][0] == self.black:  # regular capture
-                    moves.append(Move((r, c), (r-1, c+1), self.board))
-                elif (r-1, c+1) == self.enpassant_possible:  # en passant capture
-                    moves.append(Move((r, c), (r-1, c+1), self.board, is_enpassant_move=True))
-        else:  # black pawn moves (downward on the board)
-            # forward move - one square
-            if self.board[r+1][c] == self.empty_square:
-                moves.append(Move((r, c), (r+1, c), self.board))
-                # forward move - two squares from starting position
-                if r == 1 and self.board[r+2][c] == self.empty_square:
-                    moves.append(Move((r, c), (r+2, c), self.board))
-                    
-            # capture moves - diagonal left
-            if c-1 >= 0:  # check left boundary
-                if self.board[r+1][c-1][0] == self.white:  # regular capture
-                    moves.append(Move((r, c), (r+1, c-1), self.board))
-                elif (r+1, c-1) == self.enpassant_possible:  # en passant capture
-                    moves.append(Move((r, c), (r+1, c-1), self.board, is_enpassant_move=True))
-                    
-            # capture moves - diagonal right
-            if c+1 <= 7:  # check right boundary
-                if self.board[r+1][c+1][0] == self.white:  # regular capture
-                    moves.append(Move((r, c), (r+1, c+1), self.board))
-                elif (r+1, c+1) == self.enpassant_possible:  # en passant capture
-                    moves.append(Move((r, c), (r+1, c+1), self.board, is_enpassant_move=True))
+        board_flat = self.board_flat
+        empty = ~self.occ_all & MASK_64
+        
+        if self.white_to_move:  # white pawns move upward on the board (toward lower squares)
+            moved = WHITE_PAWN
+            pawns = self.piece_bb[PIECE_INDEX["wp"]]
+            enemy_occ = self.occ_black
+            singles = (pawns >> 8) & empty
+            doubles = ((singles & ROW_BB[5]) >> 8) & empty
+            left = (pawns >> 9) & ~FILE_H_BB & enemy_occ
+            right = (pawns >> 7) & ~FILE_A_BB & enemy_occ
+            step = -8
+            promo_row = ROW_BB[0]
+            # our pawns that could capture onto the ep square sit where an enemy pawn there would attack
+            ep_attackers = BLACK_PAWN_ATTACKS
+            enemy_pawn = BLACK_PAWN
+        else:  # black pawns move downward (toward higher squares)
+            moved = BLACK_PAWN
+            pawns = self.piece_bb[PIECE_INDEX["bp"]]
+            enemy_occ = self.occ_white
+            singles = (pawns << 8) & empty
+            doubles = ((singles & ROW_BB[2]) << 8) & empty
+            left = (pawns << 7) & ~FILE_H_BB & enemy_occ
+            right = (pawns << 9) & ~FILE_A_BB & enemy_occ
+            step = 8
+            promo_row = ROW_BB[7]
+            ep_attackers = WHITE_PAWN_ATTACKS
+            enemy_pawn = WHITE_PAWN
+        
+        # each target set with how far its pawns moved, the from square is the target minus that
+        # (promotion is always to a queen, 4 codes after the pawn)
+        for targets, delta in ((singles, step), (doubles, 2 * step), (left, step - 1), (right, step + 1)):
+            while targets:
+                lsb = targets & -targets
+                end_sq = lsb.bit_length() - 1
+                promo = moved + 4 if promo_row & lsb else 0
+                buf[n] = pack_move(end_sq - delta, end_sq, 0, promo, board_flat[end_sq], moved)
+                n += 1
+                targets ^= lsb
+        
+        # en passant capture (the target square is empty, the captured pawn sits beside the capturer)
+        ep_sq = self.enpassant_sq
+        if ep_sq >= 0:
+            capturers = ep_attackers[ep_sq] & pawns
+            while capturers:
+                lsb = capturers & -capturers
+                buf[n] = pack_move(lsb.bit_length() - 1, ep_sq, FLAG_ENPASSANT, 0, enemy_pawn, moved)
+                n += 1
+                capturers ^= lsb
+        return n
+
+    def _append_targets(self, sq: int, targets: int, buf: array, n: int) -> int:
+        """Write a packed move from sq to every square in a target bitboard
+        
+        Args:
+            sq: Square index of the moving piece
+            targets: Bitboard of squares it can move to
+            buf: Move buffer to write into
+            n: Number of moves already in buf
+            
+        Returns:
+            int: the new number of moves in buf
+        """
+        board_flat = self.board_flat
+        # the from square and moving piece are shared by every move
+        base = sq | (board_flat[sq] << 24)
+        
+        # pop one target bit at a time
+        while targets:
+            lsb = targets & -targets
+            end_sq = lsb.bit_length() - 1
+            buf[n] = base | (end_sq << 6) | (board_flat[end_sq] << 20)
+            n += 1
+            targets ^= lsb
+        return n
 
-    def generate_rook_moves(self, r: int, c: int, moves: list) -> None:
+    def generate_rook_moves(self, sq: int, buf: array, n: int) -> int:
         """Generate all possible rook moves from the given position
         
         Args:
-            r: Row of the rook
-            c: Column of the rook
-            moves: List to append valid moves to
+            sq: Square index of the rook
+            buf: Move buffer to write into
+            n: Number of moves already in buf
+            
+        Returns:
+            int: the new number of moves in buf
         """
-        # rook moves in straight lines (horizontal and vertical)
-        straight_directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]  # up, down, left, right
-        enemy_color = self.BLACK if self.whiteToMove else self.WHITE
-        
-        # check each direction
-        for direction in straight_directions:
-            for distance in range(1, 8):  # maximum distance is 7 squares
-                end_row = r + direction[0] * distance
-                end_col = c + direction[1] * distance
-                
-                # check if the position is within board boundaries
-                if not (0 <= end_row < 8 and 0 <= end_col < 8):
-                    break
-                    
-                end_piece = self.board[end_row][end_col]
-                
-                if end_piece == self.EMPTY_SQUARE:  # empty square - valid move
-                    moves.append(Move((r, c), (end_row, end_col), self.board))
-                elif end_piece[0] == enemy_color:  # enemy piece - capture and stop
-                    moves.append(Move((r, c), (end_row, end_col), self.board))
-                    break
-                else:  # friendly piece - stop looking in this direction (poorly phrased pls fix this)
-                    break
+        own_occ = self.occ_white if self.white_to_move else self.occ_black
+        
+        # one magic lookup gives every square the rook sees, then drop our own pieces
+        return self._append_targets(sq, rook_attacks(sq, self.occ_all) & ~own_occ, buf, n)
 
-    def generate_knight_moves(self, r: int, c: int, moves: list) -> None:
+    def generate_knight_moves(self, sq: int, buf: array, n: int) -> int:
         """Generate all possible knight moves from the given position
         
         Args:
-            r: Row of the knight
-            c: Column of the knight
-            moves: List to append valid moves to
-        """
-        # Knight moves in L-shape pattern
-        knight_directions = [(-2, -1), (-1, -2), (1, -2), (2, -1), 
-                            (2, 1), (1, 2), (-1, 2), (-2, 1)]
-        ally_color = self.WHITE if self.whiteToMove else self.BLACK
-        
-        # Check each possible knight move
-        for direction in knight_directions:
-            end_row = r + direction[0]
-            end_col = c + direction[1]
+            sq: Square index of the knight
+            buf: Move buffer to write into
+            n: Number of moves already in buf
             
-            # Check if the position is within board boundaries
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = self.board[end_row][end_col]
-                # Valid move if square is empty or contains enemy piece
-                if end_piece[0] != ally_color:  # Not an ally piece
-                    moves.append(Move((r, c), (end_row, end_col), self.board))
+        Returns:
+            int: the new number of moves in buf
+        """
+        own_occ = self.occ_white if self.white_to_move else self.occ_black
+        
+        # Knight targets come from the table, minus squares holding our own pieces
+        return self._append_targets(sq, KNIGHT_ATTACKS[sq] & ~own_occ, buf, n)
 
-    def generate_bishop_moves(self, r: int, c: int, moves: list) -> None:
+    def generate_bishop_moves(self, sq: int, buf: array, n: int) -> int:
         """Generate all possible bishop moves from the given position
         
         Args:
-            r: Row of the bishop
-            c: Column of the bishop
-            moves: List to append valid moves to
+            sq: Square index of the bishop
+            buf: Move buffer to write into
+            n: Number of moves already in buf
+            
+        Returns:
+            int: the new number of moves in buf
         """
-        # bishop moves in diagonal lines
-        diagonal_directions = [(-1, -1), (1, 1), (1, -1), (-1, 1)]  # diagonals
-        enemy_color = self.BLACK if self.whiteToMove else self.WHITE
-        
-        # check each direction
-        for direction in diagonal_directions:
-            for distance in range(1, 8):  # maximum distance is 7 squares
-                end_row = r + direction[0] * distance
-                end_col = c + direction[1] * distance
-                
-                # check if the position is within board boundaries
-                if not (0 <= end_row < 8 and 0 <= end_col < 8):
-                    break
-                    
-                end_piece = self.board[end_row][end_col]
-                
-                if end_piece == self.EMPTY_SQUARE:  # empty square - valid move
-                    moves.append(Move((r, c), (end_row, end_col), self.board))
-                elif end_piece[0] == enemy_color:  # enemy piece - capture and stop
-                    moves.append(Move((r, c), (end_row, end_col), self.board))
-                    break
-                else:  # friendly piece - stop looking in this direction
-                    break
+        own_occ = self.occ_white if self.white_to_move else self.occ_black
+        
+        # one magic lookup gives every square the bishop sees, then drop our own pieces
+        return self._append_targets(sq, bishop_attacks(sq, self.occ_all) & ~own_occ, buf, n)
 
-    def generate_queen_moves(self, r: int, c: int, moves: list) -> None:
+    def generate_queen_moves(self, sq: int, buf: array, n: int) -> int:
         """Generate all possible queen moves from the given position
         
         Args:
-            r: Row of the queen
-            c: Column of the queen
-            moves: List to append valid moves to
+            sq: Square index of the queen
+            buf: Move buffer to write into
+            n: Number of moves already in buf
+            
+        Returns:
+            int: the new number of moves in buf
         """
-        # queen combines rook and bishop movement patterns
-        self.generate_rook_moves(r, c, moves)    # horizontal and vertical moves
-        self.generate_bishop_moves(r, c, moves)  # diagonal moves
+        own_occ = self.occ_white if self.white_to_move else self.occ_black
+        
+        # queen combines rook and bishop movement patterns in one fused lookup
+        return self._append_targets(sq, queen_attacks(sq, self.occ_all) & ~own_occ, buf, n)
 
-    def generate_king_moves(self, r: int, c: int, moves: list) -> None:
+    def generate_king_moves(self, sq: int, buf: array, n: int) -> int:
         """Generate all possible king moves from the given position
         
         Args:
-            r: Row of the king
-            c: Column of the king
-            moves: List to append valid moves to
-        """
-        # king moves one square in any direction
-        king_directions = [(-1, 0), (1, 0), (0, -1), (0, 1),  # orthogonal
-                          (-1, -1), (1, 1), (1, -1), (-1, 1)]  # diagonal
-        ally_color = self.WHITE if self.whiteToMove else self.BLACK
-        
-        # check each possible king move
-        for direction in king_directions:
-            end_row = r + direction[0]
-            end_col = c + direction[1]
+            sq: Square index of the king
+            buf: Move buffer to write into
+            n: Number of moves already in buf
             
-            # check if the position is within board boundaries
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = self.board[end_row][end_col]
-                # valid move if square is empty or contains enemy piece
-                if end_piece[0] != ally_color:  # not an ally piece
-                    moves.append(Move((r, c), (end_row, end_col), self.board))
+        Returns:
+            int: the new number of moves in buf
+        """
+        own_occ = self.occ_white if self.white_to_move else self.occ_black
+        
+        # king targets come from the table, minus squares holding our own pieces
+        return self._append_targets(sq, KING_ATTACKS[sq] & ~own_occ, buf, n)
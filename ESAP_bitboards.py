@@ -0,0 +1,238 @@
+from typing import List, Tuple
+import random
+
+# bitboard attack tables and zobrist keys shared by the engines
+# square index is row * 8 + col, so bit 0 is a8 and bit 63 is h1
+
+# magic multipliers for this square order (a8 = 0, h1 = 63), found offline by random search
+# (the published tables assume a1 = 0 so they can't be copied over directly)
+ROOK_MAGICS = (
+    0x2080001440022581, 0x1080200040001080, 0x4080100008200080, 0x0280080080100254,
+    0x4D8004000A180080, 0x0100080400020100, 0x1080010040800200, 0x0200004402002081,
+    0x0068800024884004, 0x1000804000802002, 0x000200208A001040, 0x3008801000800800,
+    0x2006001060440A00, 0x1000800200800400, 0x0004000441024810, 0xA001000082004100,
+    0x0040808000204014, 0x0000424002201000, 0x0010110041002000, 0x0000090021041000,
+    0x0204008004800800, 0x0000808004000200, 0x6006040021485042, 0x0000020002409924,
+    0x2000401980028020, 0x4000400100308100, 0x0000820200201041, 0xB100100080800800,
+    0x3004080080040080, 0x0802000200041009, 0x01A0580400021110, 0x00020042000408A1,
+    0x4218884000800023, 0x0480201000400045, 0x0010200080801000, 0x1200200901001000,
+    0x0000100801000500, 0x0080020080800400, 0x004A000100404080, 0x0480005402001081,
+    0x258000402000C000, 0xA010004820084002, 0x0480200010008080, 0x244100100021000C,
+    0x2040080005010010, 0x0012000810020004, 0x0011000200B9000C, 0x1121000080410002,
+    0x00082080410A0600, 0x4002008100402600, 0x0A0300E008544100, 0x7B00080010008080,
+    0x0300080100100500, 0x0002020080040080, 0x0042521810214400, 0x8A00004089140200,
+    0x00001280010A2041, 0x0400401102042086, 0x41902000100C4101, 0x0043020420900009,
+    0x00E2000410082002, 0x4402000108041002, 0x2100101A00814804, 0x0400010400218246,
+)
+BISHOP_MAGICS = (
+    0x0102040418220020, 0x0108024802002028, 0x8010044040400001, 0x0022209200044800,
+    0x4004504005040114, 0x0022010420A80800, 0x0008441008090002, 0x0000420801480200,
+    0x1100220244011C00, 0x00883004081AB020, 0x4400100152002000, 0x4019080841004000,
+    0x2861021210000000, 0x400EA10108400020, 0x4800208208A24000, 0x0020A500A0842085,
+    0x3410000802504400, 0x0010E0200C010060, 0x0014182042408200, 0x4094006840112109,
+    0x2014200202010000, 0x000100020080C400, 0x800400420D2C0200, 0x0002200182251000,
+    0x0010F10304C41000, 0x001024A008281084, 0x0088110002040100, 0x0820080001004008,
+    0x0104040020410050, 0x0110002027040500, 0x418C008009182100, 0x2C00A9040C80480B,
+    0x008110C8005020A4, 0x4004210802041000, 0x0004020108208100, 0x0000080800120A00,
+    0x430C008400820102, 0x1400808100020108, 0x005006020010A8A0, 0x000801868004A220,
+    0x00420105C00C2000, 0x1010921032019040, 0x0300222028103000, 0x0008004208001080,
+    0x5410202248811400, 0x0008010800800808, 0x3C02C20404000900, 0x0408022282040032,
+    0x0000941002100000, 0x0112209A10100804, 0x080C020111210000, 0x442002A442022008,
+    0x00084A181B040000, 0x00115021021C2080, 0x4010051000A20000, 0x0404688085060000,
+    0x0000220110011000, 0x140000220734200C, 0x0440010424020800, 0x2204828883460800,
+    0x0020000004050410, 0x4060004A20082080, 0x00489034B002C201, 0x0444049010410300,
+)
+
+MASK_64 = (1 << 64) - 1
+
+# slider ray directions as (row, col) steps, built once at import
+ROOK_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (1, 1), (1, -1), (-1, 1))
+
+def _slider_mask(sq: int, directions: Tuple[Tuple[int, int], ...]) -> int:
+    """Squares whose occupancy can change a slider's attacks (the board edge never matters)
+    
+    Args:
+        sq: Square index of the slider
+        directions: (row, col) ray directions of the slider
+        
+    Returns:
+        int: bitboard of relevant blocker squares
+    """
+    r, c = divmod(sq, 8)
+    mask = 0
+    for dr, dc in directions:
+        end_row, end_col = r + dr, c + dc
+        while 0 <= end_row + dr < 8 and 0 <= end_col + dc < 8:
+            mask |= 1 << (end_row * 8 + end_col)
+            end_row += dr
+            end_col += dc
+    return mask
+
+def slider_attacks(sq: int, occ: int, directions: Tuple[Tuple[int, int], ...]) -> int:
+    """Walk each ray until it hits a blocker (slow, only used to fill lookup tables)
+    
+    Args:
+        sq: Square index of the slider
+        occ: Occupancy bitboard
+        directions: (row, col) ray directions of the slider
+        
+    Returns:
+        int: bitboard of attacked squares, blockers included
+    """
+    r, c = divmod(sq, 8)
+    attacks = 0
+    for dr, dc in directions:
+        end_row, end_col = r + dr, c + dc
+        while 0 <= end_row < 8 and 0 <= end_col < 8:
+            bit = 1 << (end_row * 8 + end_col)
+            attacks |= bit
+            if occ & bit:
+                break
+            end_row += dr
+            end_col += dc
+    return attacks
+
+def _build_magic_tables(directions: Tuple[Tuple[int, int], ...], magics: Tuple[int, ...]) -> Tuple[List[int], List[int], List[List[int]]]:
+    """Fill the per-square attack tables for a slider from its magic numbers
+    
+    Args:
+        directions: (row, col) ray directions of the slider
+        magics: one magic multiplier per square
+        
+    Returns:
+        tuple: (masks, shifts, attack tables) each indexed by square
+    """
+    masks, shifts, tables = [], [], []
+    for sq in range(64):
+        mask = _slider_mask(sq, directions)
+        bits = bin(mask).count("1")
+        table = [0] * (1 << bits)
+        # enumerate every subset of the mask (carry-rippler trick)
+        subset = 0
+        while True:
+            table[((subset * magics[sq]) & MASK_64) >> (64 - bits)] = slider_attacks(sq, subset, directions)
+            subset = (subset - mask) & mask
+            if not subset:
+                break
+        masks.append(mask)
+        shifts.append(64 - bits)
+        tables.append(table)
+    return masks, shifts, tables
+
+ROOK_MASKS, ROOK_SHIFTS, ROOK_ATTACK_TABLE = _build_magic_tables(ROOK_DIRECTIONS, ROOK_MAGICS)
+BISHOP_MASKS, BISHOP_SHIFTS, BISHOP_ATTACK_TABLE = _build_magic_tables(BISHOP_DIRECTIONS, BISHOP_MAGICS)
+
+def rook_attacks(sq: int, occ: int) -> int:
+    """Rook attacks from a square for a given occupancy (one multiply, shift and lookup)"""
+    return ROOK_ATTACK_TABLE[sq][((occ & ROOK_MASKS[sq]) * ROOK_MAGICS[sq] & MASK_64) >> ROOK_SHIFTS[sq]]
+
+def bishop_attacks(sq: int, occ: int) -> int:
+    """Bishop attacks from a square for a given occupancy (one multiply, shift and lookup)"""
+    return BISHOP_ATTACK_TABLE[sq][((occ & BISHOP_MASKS[sq]) * BISHOP_MAGICS[sq] & MASK_64) >> BISHOP_SHIFTS[sq]]
+
+def queen_attacks(sq: int, occ: int) -> int:
+    """Queen attacks from a square, the union of both slider lookups"""
+    return (ROOK_ATTACK_TABLE[sq][((occ & ROOK_MASKS[sq]) * ROOK_MAGICS[sq] & MASK_64) >> ROOK_SHIFTS[sq]]
+            | BISHOP_ATTACK_TABLE[sq][((occ & BISHOP_MASKS[sq]) * BISHOP_MAGICS[sq] & MASK_64) >> BISHOP_SHIFTS[sq]])
+
+def _build_step_attacks(offsets: List[Tuple[int, int]]) -> List[int]:
+    """Build a 64-entry attack table for a piece that steps by fixed offsets
+    
+    Args:
+        offsets: (row, col) steps the piece can make
+        
+    Returns:
+        list: bitboard of target squares for every starting square
+    """
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        attacks = 0
+        for dr, dc in offsets:
+            if 0 <= r + dr < 8 and 0 <= c + dc < 8:
+                attacks |= 1 << ((r + dr) * 8 + c + dc)
+        table.append(attacks)
+    return table
+
+KNIGHT_OFFSETS = [(-2, -1), (-1, -2), (1, -2), (2, -1), (2, 1), (1, 2), (-1, 2), (-2, 1)]
+KING_OFFSETS = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, 1), (1, -1), (-1, 1)]
+WHITE_PAWN_OFFSETS = [(-1, -1), (-1, 1)]
+BLACK_PAWN_OFFSETS = [(1, -1), (1, 1)]
+
+# precomputed once at import so knight/king move generation is a table lookup
+KNIGHT_ATTACKS = _build_step_attacks(KNIGHT_OFFSETS)
+KING_ATTACKS = _build_step_attacks(KING_OFFSETS)
+# squares a pawn on each square attacks (white pawns move up the board, black pawns down),
+# used for pawn captures and for spotting pawn attackers
+WHITE_PAWN_ATTACKS = _build_step_attacks(WHITE_PAWN_OFFSETS)
+BLACK_PAWN_ATTACKS = _build_step_attacks(BLACK_PAWN_OFFSETS)
+
+def _build_step_shifts(offsets: List[Tuple[int, int]]) -> Tuple[Tuple[int, int], ...]:
+    """Build the (shift, source mask) pairs that step a whole bitboard of pieces by each offset
+    
+    Args:
+        offsets: (row, col) steps the piece can make
+        
+    Returns:
+        tuple: one (row * 8 + col, mask of squares that can make that step) pair per offset,
+        the mask drops pieces that would wrap around the side of the board
+    """
+    shifts = []
+    for dr, dc in offsets:
+        mask = 0
+        for sq in range(64):
+            if 0 <= (sq & 7) + dc < 8:
+                mask |= 1 << sq
+        shifts.append((dr * 8 + dc, mask))
+    return tuple(shifts)
+
+KNIGHT_SHIFTS = _build_step_shifts(KNIGHT_OFFSETS)
+WHITE_PAWN_SHIFTS = _build_step_shifts(WHITE_PAWN_OFFSETS)
+BLACK_PAWN_SHIFTS = _build_step_shifts(BLACK_PAWN_OFFSETS)
+
+def step_attacks_set(pieces: int, shifts: Tuple[Tuple[int, int], ...]) -> int:
+    """Every square attacked by a whole bitboard of knights or pawns, one shift per offset instead of one lookup per piece"""
+    attacks = 0
+    for delta, mask in shifts:
+        if delta > 0:
+            attacks |= (pieces & mask) << delta
+        else:
+            attacks |= (pieces & mask) >> -delta
+    return attacks & MASK_64
+
+def _build_line_tables() -> Tuple[List[List[int]], List[List[int]]]:
+    """Build the squares between and the full line through every pair of aligned squares
+    
+    Returns:
+        tuple: (between, line) tables indexed [sq1][sq2], 0 when the squares don't share a line
+    """
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        for dr, dc in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+            # the whole line through sq in this direction, both ways
+            full = (1 << sq) | slider_attacks(sq, 0, ((dr, dc), (-dr, -dc)))
+            ray = 0
+            end_row, end_col = r + dr, c + dc
+            while 0 <= end_row < 8 and 0 <= end_col < 8:
+                target = end_row * 8 + end_col
+                between[sq][target] = ray
+                line[sq][target] = full
+                ray |= 1 << target
+                end_row += dr
+                end_col += dc
+    return between, line
+
+# used to work out pins and how to answer a check
+BETWEEN, LINE = _build_line_tables()
+
+# zobrist keys: one random 64-bit number per (flat code, square), for side to move,
+# per en passant file and per castling rights value (4 bits, so 16 of them)
+# (fixed seed so position keys are the same every run, row 0 is the empty square and stays zero)
+_zobrist_rng = random.Random(0)
+ZOBRIST_PIECE_SQ = [[0] * 64] + [[_zobrist_rng.getrandbits(64) for _ in range(64)] for _ in range(12)]
+ZOBRIST_SIDE = _zobrist_rng.getrandbits(64)
+ZOBRIST_EP = [_zobrist_rng.getrandbits(64) for _ in range(8)]
+ZOBRIST_CASTLE = [_zobrist_rng.getrandbits(64) for _ in range(16)]
@@ -3,6 +3,12 @@ from dataclasses import dataclass, field
 from enum import Enum, auto
 from typing import Dict, List, Tuple, Callable, Optional, Set, Union
 
+from ESAP_bitboards import ZOBRIST_PIECE_SQ
+from ESAP_movegen import board_to_flat, FLAT_CODES
+
+# flat codes 1-6 are white pieces and 7-12 black ones, so one compare gives the color
+LAST_WHITE_CODE = FLAT_CODES["wK"]
+
 BOARD_SIZE = 8
 NULL_SQUARE = "--"
 
@@ -28,8 +34,33 @@ class PieceType(Enum):
     KING = "K"
     EMPTY = "-"
 
+# int square indices for move generation: sq = row * 8 + col, so 0 is a8 and 63 is h1
+# (no objects get made per square, BoardCoordinate is for the edges like clicks and notation)
+def coord_to_sq(row: int, col: int) -> int:
+    """Turn a (row, col) coordinate into a square index"""
+    return row * BOARD_SIZE + col
+
+def sq_row(sq: int) -> int:
+    """Row of a square index"""
+    return sq >> 3
+
+def sq_col(sq: int) -> int:
+    """Column of a square index"""
+    return sq & 7
+
+# bitboard order for the 12 piece types: index = color * 6 + type
+# (bit sq of a bitboard is square sq, so bit 0 is a8 and bit 63 is h1)
+PIECE_CODES = ("wp", "wR", "wN", "wB", "wQ", "wK",
+               "bp", "bR", "bN", "bB", "bQ", "bK")
+PIECE_INDEX = {code: index for index, code in enumerate(PIECE_CODES)}
+
+# square names by square index ("a8" is 0, "h1" is 63) and the reverse lookup, built once
+SQ_TO_NOTATION = tuple(file + rank for rank in "87654321" for file in "abcdefgh")
+NOTATION_TO_SQ = {name: sq for sq, name in enumerate(SQ_TO_NOTATION)}
+
 # board coordinate class for better coordinate handling!!!!
-@dataclass(frozen=True)
+# (slots so there's no per-instance __dict__, these get made for every click and king move)
+@dataclass(frozen=True, slots=True)
 class BoardCoordinate:
     row: int
     col: int
@@ -42,28 +73,30 @@ class BoardCoordinate:
     
     def is_valid(self) -> bool:
         return 0 <= self.row < BOARD_SIZE and 0 <= self.col < BOARD_SIZE
+    
+    def to_sq(self) -> int:
+        """Square index of this coordinate"""
+        return self.row * BOARD_SIZE + self.col
+    
+    @classmethod
+    def from_sq(cls, sq: int) -> BoardCoordinate:
+        """Make a BoardCoordinate from a square index"""
+        return cls(sq >> 3, sq & 7)
         
     @classmethod
     def from_chess_notation(cls, notation: str) -> BoardCoordinate:
         """Convert chess notation (like 'h8') to a BoardCoordinate object"""
-        file_to_col = {"a": 0, "b": 1, "c": 2, "d": 3, "e": 4, "f": 5, "g": 6, "h": 7}
-        rank_to_row = {"1": 7, "2": 6, "3": 5, "4": 4, "5": 3, "6": 2, "7": 1, "8": 0}
-        
-        if len(notation) != 2:
+        sq = NOTATION_TO_SQ.get(notation.lower())
+        if sq is None:
             raise ValueError(f"Invalid chess notation: {notation}")
-        
-        file, rank = notation[0].lower(), notation[1]
-        if file not in file_to_col or rank not in rank_to_row:
-            raise ValueError(f"Invalid chess notation: {notation}")
-            
-        return cls(rank_to_row[rank], file_to_col[file])
+        return cls(sq >> 3, sq & 7)
     
     def to_chess_notation(self) -> str:
         """Convert BoardCoordinate to chess notation (like 'e4')"""
-        col_to_file = {0: "a", 1: "b", 2: "c", 3: "d", 4: "e", 5: "f", 6: "g", 7: "h"}
-        row_to_rank = {7: "1", 6: "2", 5: "3", 4: "4", 3: "5", 2: "6", 1: "7", 0: "8"}
-        
-        return col_to_file[self.col] + row_to_rank[self.row]
+        return SQ_TO_NOTATION[self.row * BOARD_SIZE + self.col]
+
+# one shared BoardCoordinate per square index (they're frozen, so handing the same one out is safe)
+SQ_TO_COORD = tuple(BoardCoordinate.from_sq(sq) for sq in range(BOARD_SIZE * BOARD_SIZE))
 
 # main chess board class
 class ChessMatrix:
@@ -80,6 +113,69 @@ class ChessMatrix:
             ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]
         ]
         
+        # one bitboard per piece type plus occupancy per color, kept in step with the grid by place()
+        self.piece_bb: List[int] = [0] * 12
+        self.occ_white = 0
+        self.occ_black = 0
+        # zobrist hash of just the piece placement, also kept up to date by place()
+        self.zobrist_key = 0
+        # flat board codes by square (ESAP_movegen layout) for the njit kernels
+        self.board_flat = bytearray(64)
+        self._sync_bitboards()
+    
+    def _sync_bitboards(self) -> None:
+        """Rebuild the bitboards, piece hash and flat board from the grid (only needed after whole rows are replaced)"""
+        self.piece_bb = [0] * 12
+        self.occ_white = 0
+        self.occ_black = 0
+        self.zobrist_key = 0
+        self.board_flat = board_to_flat(self.board)
+        for sq, code in enumerate(self.board_flat):
+            if code:
+                bit = 1 << sq
+                # bitboard index is the flat code minus one, zobrist rows are indexed by the flat code itself
+                self.piece_bb[code - 1] |= bit
+                self.zobrist_key ^= ZOBRIST_PIECE_SQ[code][sq]
+                if code <= LAST_WHITE_CODE:
+                    self.occ_white |= bit
+                else:
+                    self.occ_black |= bit
+    
+    def place(self, row: int, col: int, piece: str) -> None:
+        """Put a piece (or NULL_SQUARE) on a square and update the bitboards, piece hash and flat board to match
+        
+        All writes to the board should go through here (or set_piece), writing
+        board[row][col] directly would leave the bitboards out of date.
+        The updates work on flat codes, the old piece is read from board_flat, so the only
+        string work is the one FLAT_CODES lookup for the new piece.
+        """
+        sq = row * BOARD_SIZE + col
+        bit = 1 << sq
+        board_flat = self.board_flat
+        old_code = board_flat[sq]
+        if old_code:
+            self.piece_bb[old_code - 1] ^= bit
+            self.zobrist_key ^= ZOBRIST_PIECE_SQ[old_code][sq]
+            if old_code <= LAST_WHITE_CODE:
+                self.occ_white ^= bit
+            else:
+                self.occ_black ^= bit
+        code = FLAT_CODES[piece]
+        if code:
+            self.piece_bb[code - 1] ^= bit
+            self.zobrist_key ^= ZOBRIST_PIECE_SQ[code][sq]
+            if code <= LAST_WHITE_CODE:
+                self.occ_white ^= bit
+            else:
+                self.occ_black ^= bit
+        board_flat[sq] = code
+        self.board[row][col] = piece
+    
+    @property
+    def occ_all(self) -> int:
+        """Bitboard of every occupied square"""
+        return self.occ_white | self.occ_black
+        
     def get_piece(self, pos: BoardCoordinate) -> str:
         """Get the piece at the specified position"""
         if not pos.is_valid():
@@ -89,7 +185,7 @@ class ChessMatrix:
     def set_piece(self, pos: BoardCoordinate, piece: str) -> None:
         """Set the piece at the specified position"""
         if pos.is_valid():
-            self.board[pos.row][pos.col] = piece
+            self.place(pos.row, pos.col, piece)
     
     def is_empty(self, pos: BoardCoordinate) -> bool:
         """Check if the position is empty"""
@@ -109,3 +205,8 @@ class ChessMatrix:
     def __setitem__(self, row, value):
         """Allow setting rows with board[row] = value"""
         self.board[row] = value
+        self._sync_bitboards()
+
+# older names for the same classes, so code and annotations written against them keep working
+Position = BoardCoordinate
+ChessBoard = ChessMatrix
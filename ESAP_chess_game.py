@@ -1,10 +1,57 @@
 from __future__ import annotations
-from typing import List, Tuple, Dict, Optional, Set
-from copy import deepcopy
+from typing import List, Tuple, Optional, Iterator
+from array import array
 
-from ESAP_chess_core import BoardCoordinate, PieceColor, PieceType, NULL_SQUARE, ChessMatrix
-from ESAP_chess_moves import Move, CastleRights, MoveGenerator
-from ESAP_chess_pieces import PieceMovementFactory
+from ESAP_chess_core import BoardCoordinate, NULL_SQUARE, ChessMatrix, PIECE_CODES, PIECE_INDEX, SQ_TO_COORD
+from ESAP_chess_moves import (Move, MoveGenerator, CASTLE_WKS, CASTLE_WQS, CASTLE_BKS, CASTLE_BQS,
+                              CASTLE_ALL)
+from ESAP_chess_pieces import MOVEMENT_STRATEGIES
+from ESAP_bitboards import (ZOBRIST_SIDE, ZOBRIST_EP, ZOBRIST_CASTLE, KNIGHT_ATTACKS, KING_ATTACKS,
+                            WHITE_PAWN_ATTACKS, BLACK_PAWN_ATTACKS, rook_attacks, bishop_attacks,
+                            KNIGHT_SHIFTS, WHITE_PAWN_SHIFTS, BLACK_PAWN_SHIFTS, step_attacks_set)
+from ESAP_movegen import find_pins_and_checks, is_square_attacked, MAX_PINS, MAX_CHECKS, FLAT_CODES
+
+# bitboard indexes check_insufficient_material reads, looked up once here
+WHITE_KING_INDEX = PIECE_INDEX["wK"]
+BLACK_KING_INDEX = PIECE_INDEX["bK"]
+WHITE_KNIGHT_INDEX = PIECE_INDEX["wN"]
+BLACK_KNIGHT_INDEX = PIECE_INDEX["bN"]
+WHITE_BISHOP_INDEX = PIECE_INDEX["wB"]
+BLACK_BISHOP_INDEX = PIECE_INDEX["bB"]
+# console symbols for print_board (uppercase white, lowercase black)
+PIECE_SYMBOLS = {
+    "wp": "P", "wR": "R", "wN": "N", "wB": "B", "wQ": "Q", "wK": "K",
+    "bp": "p", "bR": "r", "bN": "n", "bB": "b", "bQ": "q", "bK": "k",
+    NULL_SQUARE: "."
+}
+# the same symbols as a bytes.translate table over flat board codes (0 is empty, then PIECE_CODES order)
+FLAT_SYMBOLS = bytes.maketrans(bytes(range(len(PIECE_CODES) + 1)),
+                               (PIECE_SYMBOLS[NULL_SQUARE] + "".join(PIECE_SYMBOLS[code] for code in PIECE_CODES)).encode())
+
+# flat board codes (bitboard index plus one) the check filter compares against
+WHITE_KNIGHT_CODE = FLAT_CODES["wN"]
+BLACK_KNIGHT_CODE = FLAT_CODES["bN"]
+
+# every square a rook / bishop on each square could reach on an empty board, so a quick AND
+# tells whether any enemy slider even shares a line with the king
+ROOK_LINES = tuple(rook_attacks(sq, 0) for sq in range(64))
+BISHOP_LINES = tuple(bishop_attacks(sq, 0) for sq in range(64))
+# enemy piece bitboard indexes as seen from each side, indexed by is_white like king_sqs
+# ([0] for a black king so the white pieces, [1] for a white king so the black pieces)
+ENEMY_PAWN_INDEX = (PIECE_INDEX["wp"], PIECE_INDEX["bp"])
+ENEMY_ROOK_INDEX = (PIECE_INDEX["wR"], PIECE_INDEX["bR"])
+ENEMY_KNIGHT_INDEX = (PIECE_INDEX["wN"], PIECE_INDEX["bN"])
+ENEMY_BISHOP_INDEX = (PIECE_INDEX["wB"], PIECE_INDEX["bB"])
+ENEMY_QUEEN_INDEX = (PIECE_INDEX["wQ"], PIECE_INDEX["bQ"])
+ENEMY_KING_INDEX = (PIECE_INDEX["wK"], PIECE_INDEX["bK"])
+# squares an enemy pawn has to stand on to attack the king, same indexing
+# (a white king is attacked from where a white pawn on its square would attack, and the other way round)
+PAWN_CHECK_SQUARES = (BLACK_PAWN_ATTACKS, WHITE_PAWN_ATTACKS)
+# shifts for the enemy pawns' attacks, same indexing
+ENEMY_PAWN_SHIFTS = (WHITE_PAWN_SHIFTS, BLACK_PAWN_SHIFTS)
+
+# castling rook moves by the king's destination column: (rook start column, rook end column)
+CASTLE_ROOK_COLS = {6: (7, 5), 2: (0, 3)}
 
 class GameState:
     """Main class for managing the chess game state"""
@@ -19,24 +66,39 @@ class GameState:
         # move history
         self.move_log = []
         
-        # track king positions
-        self.white_king_position = BoardCoordinate(7, 4)
-        self.black_king_position = BoardCoordinate(0, 4)
+        # track king positions as square indexes, indexed by side: [0] black, [1] white, so king_sqs[white_to_move]
+        # is the side to move's king (white_king_position / black_king_position give BoardCoordinates)
+        self.king_sqs = [4, 60]
         
         # track check status
         self.in_check = False
         self.pins = []
         self.checks = []
-        
-        # en crossaint tracking
-        self.enpassant_target = None
-        
-        # castling rights
-        self.castle_rights = CastleRights(True, True, True, True)
-        self.castle_rights_log = [CastleRights(True, True, True, True)]
+        # the same pins by square index -> (row, col) direction, what the movement strategies read
+        self.pin_map = {}
+        # scratch buffers the pin / check kernel writes into (four signed bytes per entry)
+        self._pin_buf = array("b", bytes(4 * MAX_PINS))
+        self._check_buf = array("b", bytes(4 * MAX_CHECKS))
+        # piece hash and side the check status above was worked out for (None means work it out again)
+        self._checks_key: Optional[int] = None
+        self._checks_white = True
+        
+        # en crossaint tracking, the target from before each move is logged for undo
+        self.enpassant_target: Optional[BoardCoordinate] = None
+        self.enpassant_log: List[Optional[BoardCoordinate]] = []
+        
+        # castling rights as a 4-bit int of CASTLE_* flags, the rights from before each move are logged for undo
+        self.castle_rights = CASTLE_ALL
+        self.castle_rights_log: List[int] = []
         
         # position repetition tracking for draw detection
-        self.position_history = {}
+        # zobrist key of the whole position, updated by make_move and put back from the log by undo_move
+        # (the log holds the key from before each move, so it's also the list of positions reached)
+        self.zobrist_key = self.board.zobrist_key ^ ZOBRIST_CASTLE[CASTLE_ALL]
+        self.zobrist_log: List[int] = []
+        # plies since the last pawn move or capture, nothing before that can come up again
+        self.reversible_plies = 0
+        self.reversible_plies_log: List[int] = []
         self.threefold_repetition = False
         
         # insufficient material draw detection (cant checkmate)
@@ -51,12 +113,66 @@ class GameState:
             "Q": self.get_queen_moves,
             "K": self.get_king_moves
         }
+        # the same functions in a tuple indexed by flat board code (None for empty), for the generation loop
+        self._move_function_lut = (None,) + tuple(self.move_functions[code[1]] for code in PIECE_CODES)
+        
+        # move lists perft reuses, one per ply (grown on demand)
+        self._ply_moves: List[List[Move]] = []
+        
+        # the movement strategies hold no state, every game uses the shared ones from ESAP_chess_pieces
+        self._strategies = MOVEMENT_STRATEGIES
+        # the strategies get_all_possible_moves can call straight away, by flat board code
+        # (None for empty squares, pawns and kings, those need the extra arguments their get_*_moves pass)
+        self._strategy_lut = (None,) + tuple(None if code[1] in "pK" else self._strategies[code[1]]
+                                             for code in PIECE_CODES)
+    
+    @property
+    def white_king_sq(self) -> int:
+        """White king's square index"""
+        return self.king_sqs[1]
+    
+    @white_king_sq.setter
+    def white_king_sq(self, sq: int) -> None:
+        self.king_sqs[1] = sq
+    
+    @property
+    def black_king_sq(self) -> int:
+        """Black king's square index"""
+        return self.king_sqs[0]
+    
+    @black_king_sq.setter
+    def black_king_sq(self, sq: int) -> None:
+        self.king_sqs[0] = sq
+    
+    @property
+    def white_king_position(self) -> BoardCoordinate:
+        """White king's square as a BoardCoordinate (a shared one, nothing is allocated)"""
+        return SQ_TO_COORD[self.king_sqs[1]]
+    
+    @white_king_position.setter
+    def white_king_position(self, position: BoardCoordinate) -> None:
+        self.king_sqs[1] = position.row * 8 + position.col
+    
+    @property
+    def black_king_position(self) -> BoardCoordinate:
+        """Black king's square as a BoardCoordinate (a shared one, nothing is allocated)"""
+        return SQ_TO_COORD[self.king_sqs[0]]
+    
+    @black_king_position.setter
+    def black_king_position(self, position: BoardCoordinate) -> None:
+        self.king_sqs[0] = position.row * 8 + position.col
     
     def make_move(self, move: Move) -> None:
         """Execute a move on the board"""
+        # read the move and the board into locals once, everything below uses them
+        start_row, start_col, end_row, end_col = move.start_row, move.start_col, move.end_row, move.end_col
+        piece_moved = move.piece_moved
+        board = self.board
+        place = board.place
+        
         # update the board
-        self.board[move.start_row][move.start_col] = NULL_SQUARE
-        self.board[move.end_row][move.end_col] = move.piece_moved
+        place(start_row, start_col, NULL_SQUARE)
+        place(end_row, end_col, piece_moved)
         
         # add move to log
         self.move_log.append(move)
@@ -64,206 +180,202 @@ class GameState:
         # switch turns
         self.white_to_move = not self.white_to_move
         
-        # update king position if king moved
-        if move.piece_moved == "wK":
-            self.white_king_position = BoardCoordinate(move.end_row, move.end_col)
-        elif move.piece_moved == "bK":
-            self.black_king_position = BoardCoordinate(move.end_row, move.end_col)
-        
-        # handle pawn promotion
-        if move.is_pawn_promotion:
-            # default promotion to queen
-            self.board[move.end_row][move.end_col] = move.piece_moved[0] + "Q"
-        
-        # handle en passant capture
-        if move.is_enpassant_move:
-            # remove the captured pawn
-            self.board[move.start_row][move.end_col] = NULL_SQUARE
-        
-        # update en crossaint target
-        if move.piece_moved[1] == "p" and abs(move.start_row - move.end_row) == 2:
-            # set en crossaint target to the square the pawn skipped over
-            self.enpassant_target = BoardCoordinate((move.start_row + move.end_row) // 2, move.start_col)
-        else:
-            self.enpassant_target = None
+        # the en crossaint target from before the move goes on the log for undo
+        self.enpassant_log.append(self.enpassant_target)
         
-        # handle castling move
-        if move.is_castle_move:
-            # Determine if kingside or queenside castle
-            if move.end_col - move.start_col == 2:  # Kingside castle
-                # Move the rook
-                self.board[move.end_row][move.end_col - 1] = self.board[move.end_row][move.end_col + 1]
-                self.board[move.end_row][move.end_col + 1] = NULL_SQUARE
-            else:  # Queenside castle
-                # Move the rook
-                self.board[move.end_row][move.end_col + 1] = self.board[move.end_row][move.end_col - 2]
-                self.board[move.end_row][move.end_col - 2] = NULL_SQUARE
-        
-        # Update castling rights
-        self.update_castle_rights(move)
-        self.castle_rights_log.append(self.castle_rights.copy())
+        if move.is_simple:
+            # the usual move, none of the special cases below apply and no pawn skipped a square
+            self.enpassant_target = None
+        else:
+            # update king position if king moved (the turn already switched, so the mover is the other side)
+            if piece_moved[1] == "K":
+                self.king_sqs[not self.white_to_move] = end_row * 8 + end_col
+            
+            # handle pawn promotion
+            if move.is_pawn_promotion:
+                # default promotion to queen
+                place(end_row, end_col, piece_moved[0] + "Q")
+            
+            # handle en passant capture
+            if move.is_enpassant_move:
+                # remove the captured pawn
+                place(start_row, end_col, NULL_SQUARE)
+            
+            # update en crossaint target
+            if piece_moved[1] == "p" and abs(start_row - end_row) == 2:
+                # set en crossaint target to the square the pawn skipped over
+                self.enpassant_target = SQ_TO_COORD[(start_row + end_row) // 2 * 8 + start_col]
+            else:
+                self.enpassant_target = None
+            
+            # handle castling move
+            if move.is_castle_move:
+                # move the rook, the king's destination column says which side
+                rook_from, rook_to = CASTLE_ROOK_COLS[end_col]
+                place(end_row, rook_to, board[end_row][rook_from])
+                place(end_row, rook_from, NULL_SQUARE)
+        
+        # Update castling rights (the old ones go on the log so undo can put them straight back)
+        self.castle_rights_log.append(self.castle_rights)
+        if self.castle_rights:  # once they're all gone there's nothing left to take away
+            self.update_castle_rights(move)
         
         # Track position for 3-move repetition rule
-        position_key = self._get_position_key()
-        self.position_history[position_key] = self.position_history.get(position_key, 0) + 1
+        # the piece part of the key is kept up to date by place(), so only castling, en passant and side get added here
+        self.zobrist_log.append(self.zobrist_key)
+        position_key = board.zobrist_key ^ ZOBRIST_CASTLE[self.castle_rights]
+        if self.enpassant_target:
+            position_key ^= ZOBRIST_EP[start_col]
+        if not self.white_to_move:
+            position_key ^= ZOBRIST_SIDE
+        self.zobrist_key = position_key
         
         # Check for threefold repetition
-        if self.position_history[position_key] >= 3:
-            self.threefold_repetition = True
+        # only positions since the last pawn move or capture can match, and only every other one has
+        # the same side to move, so step back two plies at a time through that stretch of the key log
+        self.reversible_plies_log.append(self.reversible_plies)
+        if piece_moved[1] == "p" or move.is_capture:
+            self.reversible_plies = 0
+        else:
+            self.reversible_plies += 1
+            zobrist_log = self.zobrist_log
+            plies = len(zobrist_log)
+            # zobrist_log[plies - k] is the position k plies back (entry 0, the start position, isn't counted)
+            count = 1
+            for index in range(plies - 2, max(plies - self.reversible_plies, 1) - 1, -2):
+                if zobrist_log[index] == position_key:
+                    count += 1
+                    if count >= 3:
+                        self.threefold_repetition = True
+                        break
         
         # Update check status
-        self.in_check, self.pins, self.checks = self.check_for_pins_and_checks()
+        self._update_check_status()
     
     def undo_move(self) -> None:
         """undo the last move"""
         if not self.move_log:  # no moves to undo
             return
         
-        # get the last move
+        # get the last move, read into locals once like make_move
         move = self.move_log.pop()
+        start_row, start_col, end_row, end_col = move.start_row, move.start_col, move.end_row, move.end_col
+        piece_moved, piece_captured = move.piece_moved, move.piece_captured
+        board = self.board
+        place = board.place
         
-        # remove the position from history before undoing the move
-        position_key = self._get_position_key()
-        if position_key in self.position_history:
-            self.position_history[position_key] -= 1
-            if self.position_history[position_key] <= 0:
-                del self.position_history[position_key]
+        # take the previous key and repetition window back off their logs
+        self.zobrist_key = self.zobrist_log.pop()
+        self.reversible_plies = self.reversible_plies_log.pop()
         
         # reset threefold repetition flag
         self.threefold_repetition = False
         
         # restore the board
-        self.board[move.start_row][move.start_col] = move.piece_moved
-        self.board[move.end_row][move.end_col] = move.piece_captured
+        place(start_row, start_col, piece_moved)
+        place(end_row, end_col, piece_captured)
         
         # switch turns back
         self.white_to_move = not self.white_to_move
         
-        # update king position if king moved
-        if move.piece_moved == "wK":
-            self.white_king_position = BoardCoordinate(move.start_row, move.start_col)
-        elif move.piece_moved == "bK":
-            self.black_king_position = BoardCoordinate(move.start_row, move.start_col)
-        
-        # handle en passant capture
-        if move.is_enpassant_move:
-            # restore the captured pawn
-            self.board[move.end_row][move.end_col] = NULL_SQUARE
-            self.board[move.start_row][move.end_col] = move.piece_captured
-        
-        # restore en passant target
-        if len(self.move_log) > 0:
-            prev_move = self.move_log[-1]
-            if prev_move.piece_moved[1] == "p" and abs(prev_move.start_row - prev_move.end_row) == 2:
-                self.enpassant_target = BoardCoordinate((prev_move.start_row + prev_move.end_row) // 2, prev_move.start_col)
-            else:
-                self.enpassant_target = None
-        else:
-            self.enpassant_target = None
+        if not move.is_simple:
+            # update king position if king moved (the turn is back to the mover)
+            if piece_moved[1] == "K":
+                self.king_sqs[self.white_to_move] = start_row * 8 + start_col
+            
+            # handle en passant capture
+            if move.is_enpassant_move:
+                # restore the captured pawn
+                place(end_row, end_col, NULL_SQUARE)
+                place(start_row, end_col, piece_captured)
+            
+            # handle castling move
+            if move.is_castle_move:
+                # put the rook back, same table as make_move with the columns swapped
+                rook_from, rook_to = CASTLE_ROOK_COLS[end_col]
+                place(end_row, rook_from, board[end_row][rook_to])
+                place(end_row, rook_to, NULL_SQUARE)
         
-        # handle castling move
-        if move.is_castle_move:
-            # determine if kingside or queenside castle
-            if move.end_col - move.start_col == 2:  # kingside castle
-                # restore the rook
-                self.board[move.end_row][move.end_col + 1] = self.board[move.end_row][move.end_col - 1]
-                self.board[move.end_row][move.end_col - 1] = NULL_SQUARE
-            else:  # Queenside castle
-                # restore the rook
-                self.board[move.end_row][move.end_col - 2] = self.board[move.end_row][move.end_col + 1]
-                self.board[move.end_row][move.end_col + 1] = NULL_SQUARE
+        # restore en passant target from the log (no need to look back at the previous move)
+        self.enpassant_target = self.enpassant_log.pop()
         
         # restore castling rights
-        self.castle_rights_log.pop()
-        self.castle_rights = self.castle_rights_log[-1].copy()
+        self.castle_rights = self.castle_rights_log.pop()
         
         # update check status
-        self.in_check, self.pins, self.checks = self.check_for_pins_and_checks()
+        self._update_check_status()
     
     def update_castle_rights(self, move: Move) -> None:
         """update castling rights based on the move"""
         # if king moved, lose all castling rights for that color
         if move.piece_moved == "wK":
-            self.castle_rights.wks = False
-            self.castle_rights.wqs = False
+            self.castle_rights &= ~(CASTLE_WKS | CASTLE_WQS)
         elif move.piece_moved == "bK":
-            self.castle_rights.bks = False
-            self.castle_rights.bqs = False
+            self.castle_rights &= ~(CASTLE_BKS | CASTLE_BQS)
         
         # if rook moved, lose castling rights for that side
         elif move.piece_moved == "wR":
             if move.start_row == 7:
                 if move.start_col == 0:  # queen's rook
-                    self.castle_rights.wqs = False
+                    self.castle_rights &= ~CASTLE_WQS
                 elif move.start_col == 7:  # king's rook
-                    self.castle_rights.wks = False
+                    self.castle_rights &= ~CASTLE_WKS
         elif move.piece_moved == "bR":
             if move.start_row == 0:
                 if move.start_col == 0:  # queen's rook
-                    self.castle_rights.bqs = False
+                    self.castle_rights &= ~CASTLE_BQS
                 elif move.start_col == 7:  # king's rook
-                    self.castle_rights.bks = False
+                    self.castle_rights &= ~CASTLE_BKS
         
         # if rook is captured, lose castling rights for that side
         if move.piece_captured == "wR":
             if move.end_row == 7:
                 if move.end_col == 0:
-                    self.castle_rights.wqs = False
+                    self.castle_rights &= ~CASTLE_WQS
                 elif move.end_col == 7:
-                    self.castle_rights.wks = False
+                    self.castle_rights &= ~CASTLE_WKS
         elif move.piece_captured == "bR":
             if move.end_row == 0:
                 if move.end_col == 0:
-                    self.castle_rights.bqs = False
+                    self.castle_rights &= ~CASTLE_BQS
                 elif move.end_col == 7:
-                    self.castle_rights.bks = False
+                    self.castle_rights &= ~CASTLE_BKS
     
-    def get_valid_moves(self) -> List[Move]:
-        """Get all valid moves for the current player"""
-        moves = []
+    def get_valid_moves(self, moves: Optional[List[Move]] = None) -> List[Move]:
+        """Get all valid moves for the current player
         
-        # check for pins and checks
-        self.in_check, self.pins, self.checks = self.check_for_pins_and_checks()
+        Args:
+            moves: list to clear and fill instead of making a new one (search code can keep one
+                per ply and reuse it), by default a new list is returned so callers can hold on to it
+        """
+        if moves is None:
+            moves = []
+        else:
+            moves.clear()
+        
+        self._prepare_pins_and_checks()
         
         # get king position for the current player
-        if self.white_to_move:
-            king_row, king_col = self.white_king_position.row, self.white_king_position.col
-        else:
-            king_row, king_col = self.black_king_position.row, self.black_king_position.col
+        king_sq = self.king_sqs[self.white_to_move]
+        king_row, king_col = king_sq >> 3, king_sq & 7
         
         # if in check, need to handle checks
         if self.in_check:
             # if there's only one check, either block or capture the checking piece
             if len(self.checks) == 1:
-                check = self.checks[0]
-                check_row, check_col = check[0], check[1]
-                piece_checking = self.board[check_row][check_col]
-                valid_squares = []  # squares that pieces can move to
-                
-                # if knight is checking, must capture the knight or move the king
-                if piece_checking[1] == "N":
-                    valid_squares = [(check_row, check_col)]
-                else:
-                    # for other pieces, can block the check
-                    d_row, d_col = check[2], check[3]
-                    for i in range(1, 8):
-                        valid_square = (king_row + d_row * i, king_col + d_col * i)
-                        valid_squares.append(valid_square)
-                        if valid_square[0] == check_row and valid_square[1] == check_col:
-                            break
+                valid_squares = self._check_block_squares(king_sq)
                 
                 # get all possible moves
                 self.get_all_possible_moves(moves)
                 
-                # filter moves that don't block or capture the checking piece
-                i = len(moves) - 1
-                while i >= 0:
-                    move = moves[i]
-                    if move.piece_moved[1] != "K":  # not a king move
-                        # if the move doesn't block or capture the checking piece, remove it
-                        if (move.end_row, move.end_col) not in valid_squares:
-                            moves.pop(i)
-                    i -= 1
+                # keep king moves and the moves that block or capture the checking piece, in one pass
+                # (kept moves are written down to the front of the same list and the tail is cut off after)
+                kept = 0
+                for move in moves:
+                    if move.piece_moved[1] == "K" or valid_squares >> (move.end_row * 8 + move.end_col) & 1:
+                        moves[kept] = move
+                        kept += 1
+                del moves[kept:]
             else:  # double check, king must move
                 self.get_king_moves(king_row, king_col, moves)
         else:  # not in check, get all possible moves
@@ -281,118 +393,203 @@ class GameState:
         
         return moves
     
+    def iter_valid_moves(self) -> Iterator[Move]:
+        """Yield the legal moves one piece at a time, so a caller that only needs the first few can stop early
+        
+        The moves come out in the same order as get_valid_moves. Unlike get_valid_moves this
+        doesn't set checkmate / stalemate (that needs the whole list, see has_valid_moves),
+        and the position mustn't change while the generator is still being used.
+        """
+        self._prepare_pins_and_checks()
+        king_sq = self.king_sqs[self.white_to_move]
+        
+        if self.in_check and len(self.checks) > 1:  # double check, king must move
+            moves = []
+            self.get_king_moves(king_sq >> 3, king_sq & 7, moves)
+            yield from moves
+            return
+        
+        # squares a non-king move has to land on, every square when not in check
+        valid_squares = self._check_block_squares(king_sq) if self.in_check else -1
+        board = self.board
+        board_flat = board.board_flat
+        pins = self.pin_map
+        white_to_move = self.white_to_move
+        own = board.occ_white if white_to_move else board.occ_black
+        while own:
+            square = (own & -own).bit_length() - 1
+            own &= own - 1
+            code = board_flat[square]
+            strategy = self._strategy_lut[code]
+            if strategy is not None:
+                piece_moves = strategy.get_moves(SQ_TO_COORD[square], board, pins, white_to_move)
+            else:
+                piece_moves = []
+                self._move_function_lut[code](square >> 3, square & 7, piece_moves)
+            for move in piece_moves:
+                if move.piece_moved[1] == "K" or valid_squares >> (move.end_row * 8 + move.end_col) & 1:
+                    yield move
+    
+    def has_valid_moves(self) -> bool:
+        """Whether the side to move has any legal move, stopping at the first one found
+        
+        Sets checkmate / stalemate the same way get_valid_moves does, for search leaves that
+        only need to know if the game is over.
+        """
+        has_move = next(self.iter_valid_moves(), None) is not None
+        self.checkmate = not has_move and self.in_check
+        self.stalemate = not has_move and not self.in_check
+        return has_move
+    
+    def _prepare_pins_and_checks(self) -> None:
+        """Make sure in_check, pins, checks and pin_map are for the current position before generating moves"""
+        # make_move / undo_move have usually just done this for the same position
+        if self._checks_key != self.board.zobrist_key or self._checks_white != self.white_to_move:
+            self.in_check, self.pins, self.checks = self.check_for_pins_and_checks()
+        # the strategies look pins up by square, so one dict lookup per piece instead of a scan of the list
+        self.pin_map = {pin[0] * 8 + pin[1]: (pin[2], pin[3]) for pin in self.pins}
+    
+    def _check_block_squares(self, king_sq: int) -> int:
+        """Bitmask of the squares a non-king move can go to to answer the (single) check
+        
+        That's the checking piece's square, plus the squares between it and the king when it's a slider.
+        """
+        check = self.checks[0]
+        check_sq = check[0] * 8 + check[1]
+        piece_checking = self.board.board_flat[check_sq]
+        
+        # if knight is checking, must capture the knight or move the king
+        if piece_checking == WHITE_KNIGHT_CODE or piece_checking == BLACK_KNIGHT_CODE:
+            return 1 << check_sq
+        
+        # for other pieces, can block the check
+        # (every square from the king out to the checking piece, the walk stops there)
+        delta = check[2] * 8 + check[3]
+        valid_squares = 0
+        valid_sq = king_sq
+        for _ in range(7):
+            valid_sq += delta
+            valid_squares |= 1 << valid_sq
+            if valid_sq == check_sq:
+                break
+        return valid_squares
+    
+    def perft(self, depth: int, ply: int = 0) -> int:
+        """Count the leaf positions of the legal move tree, for checking and timing move generation
+        
+        Same driver as the bitboard GameState's perft, leaf moves are counted without being made
+        and every ply reuses its own move list.
+        (promotions are always to a queen here, so counts only match the usual tables until promotions show up)
+        
+        Args:
+            depth: How many plies deep to count
+            ply: Search ply of the current position (picks the move list)
+            
+        Returns:
+            int: number of positions reached after exactly depth plies
+        """
+        if depth == 0:
+            return 1
+        ply_moves = self._ply_moves
+        while len(ply_moves) <= ply:
+            ply_moves.append([])
+        valid_moves = self.get_valid_moves(ply_moves[ply])
+        if depth == 1:
+            return len(valid_moves)
+        
+        # bind the hot methods once instead of looking them up for every move
+        make_move = self.make_move
+        undo_move = self.undo_move
+        perft = self.perft
+        nodes = 0
+        for move in valid_moves:
+            make_move(move)
+            nodes += perft(depth - 1, ply + 1)
+            undo_move()
+        return nodes
+    
     def get_all_possible_moves(self, moves: List[Move]) -> None:
         """Get all possible moves without considering checks"""
-        # iterate through all squares on the board
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece != NULL_SQUARE:  # if there's a piece on the square
-                    piece_color = piece[0]
-                    if (piece_color == "w" and self.white_to_move) or (piece_color == "b" and not self.white_to_move):
-                        piece_type = piece[1]
-                        # call the appropriate move function for the piece
-                        self.move_functions[piece_type](row, col, moves)
+        board = self.board
+        board_flat = board.board_flat
+        move_function_lut = self._move_function_lut
+        strategy_lut = self._strategy_lut
+        pins = self.pin_map
+        white_to_move = self.white_to_move
+        # only visit the squares the side to move occupies (lowest bit first, same order as a row by row scan)
+        own = board.occ_white if white_to_move else board.occ_black
+        while own:
+            square = (own & -own).bit_length() - 1
+            own &= own - 1
+            code = board_flat[square]
+            strategy = strategy_lut[code]
+            if strategy is not None:
+                # rooks, knights, bishops and queens go straight to their strategy (same call their get_*_moves makes)
+                moves.extend(strategy.get_moves(SQ_TO_COORD[square], board, pins, white_to_move))
+            else:
+                # pawns and kings through their move function
+                move_function_lut[code](square >> 3, square & 7, moves)
+    
+    def _update_check_status(self) -> None:
+        """Work out in_check, pins and checks for the side to move and remember which position they're for"""
+        self.in_check, self.pins, self.checks = self.check_for_pins_and_checks()
+        self._checks_key = self.board.zobrist_key
+        self._checks_white = self.white_to_move
     
     def check_for_pins_and_checks(self) -> Tuple[bool, List, List]:
         """Check for pins and checks on the current player's king"""
+        king_sq = self.king_sqs[self.white_to_move]
+        return self._pins_and_checks(king_sq >> 3, king_sq & 7, self.white_to_move)
+    
+    def _pins_and_checks(self, start_row: int, start_col: int, is_white: bool) -> Tuple[bool, List, List]:
+        """Pins and checks for a king of the given color standing on (start_row, start_col)
+        
+        The ray and knight scan runs in ESAP_movegen.find_pins_and_checks over the flat board
+        and writes into the preallocated buffers, the (row, col, d_row, d_col) tuples are only
+        made for the pins and checks it actually found.
+        Before that the bitboards are checked: with no enemy slider on a line through the
+        square and no knight, pawn or king next to it there can't be any pins or checks,
+        so the scan is skipped (which is most positions).
+        """
+        square = start_row * 8 + start_col
+        bb = self.board.piece_bb
+        side = is_white  # indexes the ENEMY_* tables
+        queens = bb[ENEMY_QUEEN_INDEX[side]]
+        if not (ROOK_LINES[square] & (bb[ENEMY_ROOK_INDEX[side]] | queens)
+                or BISHOP_LINES[square] & (bb[ENEMY_BISHOP_INDEX[side]] | queens)
+                or KNIGHT_ATTACKS[square] & bb[ENEMY_KNIGHT_INDEX[side]]
+                or PAWN_CHECK_SQUARES[side][square] & bb[ENEMY_PAWN_INDEX[side]]
+                or KING_ATTACKS[square] & bb[ENEMY_KING_INDEX[side]]):
+            return False, [], []
+        
+        pin_buf = self._pin_buf
+        check_buf = self._check_buf
+        n_pins, n_checks = find_pins_and_checks(self.board.board_flat, square, is_white, pin_buf, check_buf)
         pins = []  # squares pinned and the direction of the pin
+        for k in range(0, n_pins * 4, 4):
+            pins.append((pin_buf[k], pin_buf[k + 1], pin_buf[k + 2], pin_buf[k + 3]))
         checks = []  # squares where enemy pieces are checking the king
-        in_check = False
+        for k in range(0, n_checks * 4, 4):
+            checks.append((check_buf[k], check_buf[k + 1], check_buf[k + 2], check_buf[k + 3]))
         
-        # determine ally and enemy colors based on whose turn it is
-        if self.white_to_move:
-            ally_color = "w"
-            enemy_color = "b"
-            start_row, start_col = self.white_king_position.row, self.white_king_position.col
-        else:
-            ally_color = "b"
-            enemy_color = "w"
-            start_row, start_col = self.black_king_position.row, self.black_king_position.col
-        
-        # check all eight directions around the king
-        directions = [(-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
-        for i, direction in enumerate(directions):
-            d_row, d_col = direction
-            possible_pin = ()  # reset possible pin
-            
-            # check each square in this direction
-            for j in range(1, 8):
-                end_row = start_row + d_row * j
-                end_col = start_col + d_col * j
-                
-                # check if the square is on the board
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    end_piece = self.board[end_row][end_col]
-                    
-                    # check if the piece is an ally piece (potential pin)
-                    if end_piece[0] == ally_color and end_piece[1] != "K":
-                        if possible_pin == ():  # First ally piece encountered
-                            possible_pin = (end_row, end_col, d_row, d_col)
-                        else:  # second ally piece, no pin or check possible
-                            break
-                    # check if the piece is an enemy piece
-                    elif end_piece[0] == enemy_color:
-                        piece_type = end_piece[1]
-                        
-                        # check if the piece can attack in this direction
-                        if ((0 <= i <= 3 and piece_type == "R") or  # Rook checks horizontally/vertically
-                            (4 <= i <= 7 and piece_type == "B") or  # Bishop checks diagonally
-                            (j == 1 and piece_type == "p" and  # Pawn checks
-                             ((enemy_color == "w" and 6 <= i <= 7) or  # White pawn checks diagonally down
-                              (enemy_color == "b" and 4 <= i <= 5))) or  # Black pawn checks diagonally up
-                            (piece_type == "Q") or  # Queen checks in all directions
-                            (j == 1 and piece_type == "K")):  # King checks adjacent squares
-                            
-                            # No piece blocking, so check
-                            if possible_pin == ():
-                                in_check = True
-                                checks.append((end_row, end_col, d_row, d_col))
-                                break
-                            # Piece blocking, so pin
-                            else:
-                                pins.append(possible_pin)
-                                break
-                        else:  # Enemy piece not applying check
-                            break
-                else:  # Off board
-                    break
-        
-        # check for knight checks
-        knight_moves = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
-        for move in knight_moves:
-            end_row = start_row + move[0]
-            end_col = start_col + move[1]
-            
-            # check if the square is on the board
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = self.board[end_row][end_col]
-                
-                # check if the piece is an enemy knight
-                if end_piece[0] == enemy_color and end_piece[1] == "N":
-                    in_check = True
-                    checks.append((end_row, end_col, move[0], move[1]))
+        return n_checks > 0, pins, checks
+    
+    def _square_in_check(self, start_row: int, start_col: int, is_white: bool) -> bool:
+        """Whether a king of the given color would be in check on (start_row, start_col)
         
-        return in_check, pins, checks
+        The king moves and castling use this to try out squares, the kernel stops at the
+        first attacker it finds and no pin or check tuples get built.
+        """
+        return is_square_attacked(self.board.board_flat, start_row * 8 + start_col, is_white)
     
     def get_pawn_moves(self, row: int, col: int, moves: List[Move]) -> None:
         """Get all possible pawn moves"""
-        piece_pinned = False
-        pin_direction = ()
-        
-        # check if the pawn is pinned
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == row and self.pins[i][1] == col:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                break
-        
-        # use the pawn movement strategy
-        pawn_strategy = PieceMovementFactory.create_movement_strategy("p")
+        # use the pawn movement strategy (it looks up its own pin)
+        pawn_strategy = self._strategies["p"]
         pawn_moves = pawn_strategy.get_moves(
-            BoardCoordinate(row, col), 
+            SQ_TO_COORD[row * 8 + col], 
             self.board, 
-            self.pins, 
+            self.pin_map, 
             self.white_to_move, 
             self.enpassant_target,
             self.white_king_position,
@@ -403,11 +600,11 @@ class GameState:
     def get_rook_moves(self, row: int, col: int, moves: List[Move]) -> None:
         """Get all possible rook moves"""
         # use the rook movement strategy
-        rook_strategy = PieceMovementFactory.create_movement_strategy("R")
+        rook_strategy = self._strategies["R"]
         rook_moves = rook_strategy.get_moves(
-            BoardCoordinate(row, col), 
+            SQ_TO_COORD[row * 8 + col], 
             self.board, 
-            self.pins, 
+            self.pin_map, 
             self.white_to_move
         )
         moves.extend(rook_moves)
@@ -415,11 +612,11 @@ class GameState:
     def get_knight_moves(self, row: int, col: int, moves: List[Move]) -> None:
         """Get all possible knight moves"""
         # use the knight movement strategy
-        knight_strategy = PieceMovementFactory.create_movement_strategy("N")
+        knight_strategy = self._strategies["N"]
         knight_moves = knight_strategy.get_moves(
-            BoardCoordinate(row, col), 
+            SQ_TO_COORD[row * 8 + col], 
             self.board, 
-            self.pins, 
+            self.pin_map, 
             self.white_to_move
         )
         moves.extend(knight_moves)
@@ -427,11 +624,11 @@ class GameState:
     def get_bishop_moves(self, row: int, col: int, moves: List[Move]) -> None:
         """Get all possible bishop moves"""
         # use the bishop movement strategy
-        bishop_strategy = PieceMovementFactory.create_movement_strategy("B")
+        bishop_strategy = self._strategies["B"]
         bishop_moves = bishop_strategy.get_moves(
-            BoardCoordinate(row, col), 
+            SQ_TO_COORD[row * 8 + col], 
             self.board, 
-            self.pins, 
+            self.pin_map, 
             self.white_to_move
         )
         moves.extend(bishop_moves)
@@ -439,47 +636,36 @@ class GameState:
     def get_queen_moves(self, row: int, col: int, moves: List[Move]) -> None:
         """Get all possible queen moves"""
         # use the queen movement strategy
-        queen_strategy = PieceMovementFactory.create_movement_strategy("Q")
+        queen_strategy = self._strategies["Q"]
         queen_moves = queen_strategy.get_moves(
-            BoardCoordinate(row, col), 
+            SQ_TO_COORD[row * 8 + col], 
             self.board, 
-            self.pins, 
+            self.pin_map, 
             self.white_to_move
         )
         moves.extend(queen_moves)
     
-    def check_king_safety(self, white_king_pos: BoardCoordinate, black_king_pos: BoardCoordinate) -> Tuple[bool, List, List]:
-        """Wrapper function for check_for_pins_and_checks that accepts king positions as parameters
-        This allows us to simulate king moves without actually making them"""
-        # save the current king positions
-        original_white_king = self.white_king_position
-        original_black_king = self.black_king_position
-        
-        # temporarily set the king positions to the provided positions
-        self.white_king_position = white_king_pos
-        self.black_king_position = black_king_pos
-        
-        # call the check method
-        result = self.check_for_pins_and_checks()
-        
-        # restore the original king positions
-        self.white_king_position = original_white_king
-        self.black_king_position = original_black_king
-        
-        return result
-        
     def get_king_moves(self, row: int, col: int, moves: List[Move]) -> None:
         """Get all possible king moves"""
+        # squares the enemy knights, pawns and king cover, worked out for all of them at once with
+        # bitboard shifts, so the king doesn't have to try those squares one by one
+        bb = self.board.piece_bb
+        side = self.white_to_move  # indexes the ENEMY_* tables
+        unsafe = (step_attacks_set(bb[ENEMY_KNIGHT_INDEX[side]], KNIGHT_SHIFTS)
+                  | step_attacks_set(bb[ENEMY_PAWN_INDEX[side]], ENEMY_PAWN_SHIFTS[side]))
+        enemy_king = bb[ENEMY_KING_INDEX[side]]
+        if enemy_king:
+            unsafe |= KING_ATTACKS[enemy_king.bit_length() - 1]
+        
         # use the king movement strategy for normal moves
-        king_strategy = PieceMovementFactory.create_movement_strategy("K")
+        king_strategy = self._strategies["K"]
         king_moves = king_strategy.get_moves(
-            BoardCoordinate(row, col), 
+            SQ_TO_COORD[row * 8 + col], 
             self.board, 
-            self.pins, 
+            self.pin_map, 
             self.white_to_move,
-            self.white_king_position,
-            self.black_king_position,
-            self.check_king_safety
+            self._square_in_check,
+            unsafe
         )
         moves.extend(king_moves)
         
@@ -487,7 +673,7 @@ class GameState:
         MoveGenerator.get_castle_moves(
             row, col, moves, self.board, 
             self.white_to_move, self.castle_rights, self.in_check,
-            self.check_king_safety, self.white_king_position, self.black_king_position
+            self._square_in_check
         )
     
     def is_game_over(self) -> bool:
@@ -513,8 +699,11 @@ class GameState:
         """Print the current board state to the console"""
         print("  a b c d e f g h")
         print(" +-----------------+")
+        board_flat = self.board.board_flat
         for r in range(8):
-            print(f"{8-r}|" + " ".join(self._get_piece_symbol(self.board[r][c]) for c in range(8)) + f"|{8-r}")
+            # one translate per row over the flat codes, no per-square lookups
+            row_cells = board_flat[r * 8:r * 8 + 8].translate(FLAT_SYMBOLS).decode()
+            print(f"{8-r}|" + " ".join(row_cells) + f"|{8-r}")
         print(" +-----------------+")
         print("  a b c d e f g h")
         print("")
@@ -522,12 +711,10 @@ class GameState:
     
     def _get_piece_symbol(self, piece: str) -> str:
         """Convert piece code to symbol for printing"""
-        piece_symbols = {
-            "wp": "P", "wR": "R", "wN": "N", "wB": "B", "wQ": "Q", "wK": "K",
-            "bp": "p", "bR": "r", "bN": "n", "bB": "b", "bQ": "q", "bK": "k",
-            NULL_SQUARE: "."
-        }
-        return piece_symbols.get(piece, "?")
+        try:
+            return PIECE_SYMBOLS[piece]
+        except KeyError:
+            return "?"
         
     def check_insufficient_material(self) -> None:
         """Check if there is insufficient material to checkmate (draw condition)
@@ -537,64 +724,22 @@ class GameState:
         - King + Knight vs King
         - King + 2 Knights vs King (technically possible but extremely rare)
         """
-        white_pieces = []
-        black_pieces = []
-        
-        # count pieces for each side
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece != NULL_SQUARE:
-                    if piece[0] == 'w':
-                        white_pieces.append(piece[1])
-                    else:
-                        black_pieces.append(piece[1])
-        
-        # remove kings from the count
-        if 'K' in white_pieces:
-            white_pieces.remove('K')
-        if 'K' in black_pieces:
-            black_pieces.remove('K')
-        
-        # check for insufficient material scenarios
-        if len(white_pieces) == 0 and len(black_pieces) == 0:  # king vs king
-            self.insufficient_material = True
-        elif len(white_pieces) == 1 and len(black_pieces) == 0:  # king + minor piece vs king
-            if white_pieces[0] == 'B' or white_pieces[0] == 'N':
-                self.insufficient_material = True
-        elif len(white_pieces) == 0 and len(black_pieces) == 1:  # king vs king + minor piece
-            if black_pieces[0] == 'B' or black_pieces[0] == 'N':
-                self.insufficient_material = True
-        elif len(white_pieces) == 2 and len(black_pieces) == 0:  # king + 2 kknights vs king
-            if white_pieces.count('N') == 2:
-                self.insufficient_material = True
-        elif len(white_pieces) == 0 and len(black_pieces) == 2:  # king vs king + 2 Knights
-            if black_pieces.count('N') == 2:
-                self.insufficient_material = True
-        else:
+        board = self.board
+        bb = board.piece_bb
+        # non-king pieces for each side, straight from the bitboards make_move / undo_move keep up to date
+        white_rest = board.occ_white & ~bb[WHITE_KING_INDEX]
+        black_rest = board.occ_black & ~bb[BLACK_KING_INDEX]
+        
+        # all of the cases above have one side down to a bare king, so only the other side's pieces matter
+        # (worked out fresh every call from masks, so it's right again after an undo too)
+        if white_rest and black_rest:
             self.insufficient_material = False
-    
-    def _get_position_key(self) -> str:
-        """Generate a unique key for the current board position for repetition detection
-        The key includes the board state, castling rights, en passant square, and whose turn it is"""
-        key_parts = []
-        
-        # add board state
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece != NULL_SQUARE:
-                    key_parts.append(f"{piece}@{row}{col}")
-        
-        # add castling rights
-        key_parts.append(f"castle:{int(self.castle_rights.wks)}{int(self.castle_rights.wqs)}{int(self.castle_rights.bks)}{int(self.castle_rights.bqs)}")
-        
-        # add en passant target
-        if self.enpassant_target:
-            key_parts.append(f"ep:{self.enpassant_target.row}{self.enpassant_target.col}")
-        
-        # add whose turn it is
-        key_parts.append(f"turn:{int(self.white_to_move)}")
-        
-        # Join all parts with a separator
-        return "|".join(key_parts)
+            return
+        rest = white_rest | black_rest
+        knights = bb[WHITE_KNIGHT_INDEX] | bb[BLACK_KNIGHT_INDEX]
+        minors = knights | bb[WHITE_BISHOP_INDEX] | bb[BLACK_BISHOP_INDEX]
+        self.insufficient_material = (
+            rest == 0  # king vs king
+            or (rest & (rest - 1) == 0 and rest & minors != 0)  # king + minor piece vs king
+            or (rest == rest & knights and rest.bit_count() == 2)  # king + 2 knights vs king
+        )
@@ -2,9 +2,17 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Tuple, List, Dict, Optional
 
-from ESAP_chess_core import BoardCoordinate, NULL_SQUARE
+from ESAP_chess_core import NULL_SQUARE, Position, SQ_TO_NOTATION
+from ESAP_movegen import FLAG_ENPASSANT
 
-@dataclass
+# castling rights packed into one 4-bit int (this is how GameState stores them)
+CASTLE_WKS = 1  # white king-side
+CASTLE_WQS = 2  # white queen-side
+CASTLE_BKS = 4  # black king-side
+CASTLE_BQS = 8  # black queen-side
+CASTLE_ALL = CASTLE_WKS | CASTLE_WQS | CASTLE_BKS | CASTLE_BQS
+
+@dataclass(slots=True)
 class CastleRights:
     """Class to track castling rights for both players"""
     wks: bool  # white king-side
@@ -15,36 +23,49 @@ class CastleRights:
     def copy(self) -> 'CastleRights':
         """Create a copy of the castle rights"""
         return CastleRights(self.wks, self.wqs, self.bks, self.bqs)
+    
+    def to_bits(self) -> int:
+        """Pack the rights into the 4-bit int form (CASTLE_* flags)"""
+        return self.wks * CASTLE_WKS | self.wqs * CASTLE_WQS | self.bks * CASTLE_BKS | self.bqs * CASTLE_BQS
+    
+    @classmethod
+    def from_bits(cls, bits: int) -> 'CastleRights':
+        """Unpack a 4-bit castling rights int"""
+        return cls(bool(bits & CASTLE_WKS), bool(bits & CASTLE_WQS),
+                   bool(bits & CASTLE_BKS), bool(bits & CASTLE_BQS))
+
+# piece values for ordering captures, most valuable victim first and then least valuable attacker (MVV-LVA)
+MVV_LVA_VALUES = {"p": 100, "N": 320, "B": 330, "R": 500, "Q": 900, "K": 20000}
+# sort key for quiet moves, above every capture's key (the worst capture is a king taking a pawn)
+QUIET_MOVE_KEY = MVV_LVA_VALUES["K"]
+
+# file letter by column
+FILES = "abcdefgh"
 
 class Move:
     """Represents a chess move with all relevant information"""
-    # mapping between ranks/files and board coordinates
+    # mapping between ranks/files and board coordinates (notation itself goes through SQ_TO_NOTATION,
+    # these are kept for code that still looks files and ranks up by name)
     ranks_to_rows = {"1": 7, "2": 6, "3": 5, "4": 4, "5": 3, "6": 2, "7": 1, "8": 0}
     rows_to_ranks = {v: k for k, v in ranks_to_rows.items()}
     files_to_cols = {"a": 0, "b": 1, "c": 2, "d": 3, "e": 4, "f": 5, "g": 6, "h": 7}
     cols_to_files = {v: k for k, v in files_to_cols.items()}
     
-    def __init__(self, start_sq, end_sq, board, 
+    # fixed attribute layout, no per-move __dict__ (move generation makes lots of these)
+    __slots__ = ("start_row", "start_col", "end_row", "end_col", "piece_moved", "piece_captured",
+                 "is_pawn_promotion", "is_enpassant_move", "is_castle_move", "is_capture", "is_simple", "move_id")
+    
+    def __init__(self, start_row: int, start_col: int, end_row: int, end_col: int, board,
                  is_enpassant_move: bool = False, is_castle_move: bool = False):
-        # start and end positions
-        # handle both Position objects and tuples ahhh bruhhh
-        if hasattr(start_sq, 'row') and hasattr(start_sq, 'col'):
-            self.start_row = start_sq.row
-            self.start_col = start_sq.col
-        else:
-            self.start_row = start_sq[0]
-            self.start_col = start_sq[1]
-            
-        if hasattr(end_sq, 'row') and hasattr(end_sq, 'col'):
-            self.end_row = end_sq.row
-            self.end_col = end_sq.col
-        else:
-            self.end_row = end_sq[0]
-            self.end_col = end_sq[1]
+        # start and end positions as plain ints, see from_positions / from_tuples for the other forms
+        self.start_row = start_row
+        self.start_col = start_col
+        self.end_row = end_row
+        self.end_col = end_col
         
         # piece information
-        self.piece_moved = board[self.start_row][self.start_col]
-        self.piece_captured = board[self.end_row][self.end_col]
+        self.piece_moved = board[start_row][start_col]
+        self.piece_captured = board[end_row][end_col]
         
         # special move flags
         self.is_pawn_promotion = (self.piece_moved == "wp" and self.end_row == 0) or \
@@ -56,22 +77,55 @@ class Move:
         self.is_castle_move = is_castle_move
         self.is_capture = (self.piece_captured != NULL_SQUARE)
         
-        # unique move Id for compare
-        self.move_id = self.start_col * 1000 + self.start_row * 100 + self.end_col * 10 + self.end_row
+        # just one piece moving (and maybe capturing): no king move, promotion, en passant,
+        # castling or double pawn push, make_move / undo_move skip all of their special cases for these
+        piece_type = self.piece_moved[1]
+        self.is_simple = not (self.is_pawn_promotion or is_enpassant_move or is_castle_move or piece_type == "K"
+                              or (piece_type == "p" and abs(self.start_row - self.end_row) == 2))
+        
+        # unique move Id for compare: start square in the top 6 bits, end square in the low 6
+        self.move_id = (self.start_row << 9) | (self.start_col << 6) | (self.end_row << 3) | self.end_col
+    
+    @classmethod
+    def from_positions(cls, start: Position, end: Position, board, **kwargs) -> Move:
+        """Build a Move between two Position / BoardCoordinate objects"""
+        return cls(start.row, start.col, end.row, end.col, board, **kwargs)
+    
+    @classmethod
+    def from_tuples(cls, start: Tuple[int, int], end: Tuple[int, int], board, **kwargs) -> Move:
+        """Build a Move between two (row, col) tuples"""
+        return cls(start[0], start[1], end[0], end[1], board, **kwargs)
+    
+    @classmethod
+    def from_packed(cls, packed: int, board) -> Move:
+        """Build a Move from a packed move int (ESAP_movegen layout), for UI code only
+        
+        Args:
+            packed: the packed move
+            board: board[row][col] piece strings from before the move is made
+        """
+        start_sq = packed & 63
+        end_sq = (packed >> 6) & 63
+        return cls(start_sq >> 3, start_sq & 7, end_sq >> 3, end_sq & 7, board,
+                   is_enpassant_move=bool((packed >> 12) & FLAG_ENPASSANT))
     
     def __eq__(self, other):
         """compare moves based on their unique ID"""
-        if isinstance(other, Move):
+        if type(other) is Move:
             return self.move_id == other.move_id
         return False
     
+    def __hash__(self):
+        """hash on the same ID __eq__ uses, so moves can go in sets and dict keys"""
+        return self.move_id
+    
     def get_chess_notation(self) -> str:
         """Convert move to algebraic chess notation"""
-        return self.get_file_rank(self.start_row, self.start_col) + self.get_file_rank(self.end_row, self.end_col)
+        return SQ_TO_NOTATION[self.start_row * 8 + self.start_col] + SQ_TO_NOTATION[self.end_row * 8 + self.end_col]
     
     def get_file_rank(self, row: int, col: int) -> str:
         """Convert board coordinates to file and rank notation"""
-        return self.cols_to_files[col] + self.rows_to_ranks[row]
+        return SQ_TO_NOTATION[row * 8 + col]
     
     def __str__(self) -> str:
         """String representation of the move in chess notation"""
@@ -79,12 +133,12 @@ class Move:
         if self.is_castle_move:
             return "O-O" if self.end_col == 6 else "O-O-O"
         
-        end_square = self.get_file_rank(self.end_row, self.end_col)
+        end_square = SQ_TO_NOTATION[self.end_row * 8 + self.end_col]
         
         # Pawn move
         if self.piece_moved[1] == 'p':
             if self.is_capture:
-                return self.cols_to_files[self.start_col] + "x" + end_square
+                return FILES[self.start_col] + "x" + end_square
             else:
                 return end_square
         
@@ -97,88 +151,104 @@ class Move:
 class MoveGenerator:
     """Utility class for generating and validating chess moves"""
     
+    @staticmethod
+    def mvv_lva_key(move: Move) -> int:
+        """Sort key that puts captures first, best victim and then cheapest attacker first (lower sorts first)"""
+        if move.is_capture:
+            return MVV_LVA_VALUES[move.piece_moved[1]] - MVV_LVA_VALUES[move.piece_captured[1]] * 16
+        return QUIET_MOVE_KEY
+    
+    @staticmethod
+    def order_moves(moves: List[Move], captures_only: bool = False) -> List[Move]:
+        """Sort moves in place so captures come first in MVV-LVA order, quiet moves keep their order after them
+        
+        Args:
+            moves: move list to sort
+            captures_only: drop the quiet moves too (for a quiescence search)
+            
+        Returns:
+            list: the same list
+        """
+        if captures_only:
+            moves[:] = [move for move in moves if move.is_capture]
+        moves.sort(key=MoveGenerator.mvv_lva_key)
+        return moves
+    
     @staticmethod
     def get_castle_moves(row: int, col: int, moves: List[Move], board, 
-                        is_white_turn: bool, castle_rights: CastleRights, in_check: bool,
-                        check_function=None, white_king_pos=None, black_king_pos=None):
-        """Generate castling moves if they are legal"""
+                        is_white_turn: bool, castle_rights: int, in_check: bool,
+                        check_function=None):
+        """Generate castling moves if they are legal (castle_rights is the 4-bit CASTLE_* int)
+        
+        check_function(row, col, is_white) should return True if that side's king
+        would be in check standing on (row, col).
+        """
         if in_check:
             return  # can't castle while in check
         
+        if isinstance(castle_rights, CastleRights):
+            castle_rights = castle_rights.to_bits()
+        
         # determine which castling rights to check based on whose turn it is
         if is_white_turn:
-            kingside_rights = castle_rights.wks
-            queenside_rights = castle_rights.wqs
+            kingside_rights = castle_rights & CASTLE_WKS
+            queenside_rights = castle_rights & CASTLE_WQS
             ally_color = 'w'
         else:
-            kingside_rights = castle_rights.bks
-            queenside_rights = castle_rights.bqs
+            kingside_rights = castle_rights & CASTLE_BKS
+            queenside_rights = castle_rights & CASTLE_BQS
             ally_color = 'b'
         
         # check kingside castling
         if kingside_rights:
-            MoveGenerator.get_kingside_castle_move(row, col, moves, board, ally_color, 
-                                                  check_function, white_king_pos, black_king_pos)
+            MoveGenerator.get_kingside_castle_move(row, col, moves, board, ally_color, check_function)
         
         # check queenside castling
         if queenside_rights:
-            MoveGenerator.get_queenside_castle_move(row, col, moves, board, ally_color,
-                                                   check_function, white_king_pos, black_king_pos)
+            MoveGenerator.get_queenside_castle_move(row, col, moves, board, ally_color, check_function)
     
     @staticmethod
     def get_kingside_castle_move(row: int, col: int, moves: List[Move], board, ally_color: str,
-                               check_function=None, white_king_pos=None, black_king_pos=None):
+                               check_function=None):
         """Generate kingside castling move if legal"""
         # check if squares between king and rook are empty
-        if board[row][col+1] == NULL_SQUARE and board[row][col+2] == NULL_SQUARE:
+        # (read off the flat board, 0 is an empty square)
+        sq = row * 8 + col
+        board_flat = board.board_flat
+        if not board_flat[sq + 1] and not board_flat[sq + 2]:
             # if no check function provided, we can't verify safety
             if not check_function:
-                moves.append(Move((row, col), (row, col+2), board, is_castle_move=True))
+                moves.append(Move(row, col, row, col+2, board, is_castle_move=True))
                 return
                 
             # check if king passes through or ends up in check
-            # create temporary positions for checking
-            temp_white_king_pos1 = BoardCoordinate(row, col+1) if ally_color == 'w' else white_king_pos
-            temp_black_king_pos1 = BoardCoordinate(row, col+1) if ally_color == 'b' else black_king_pos
-            
-            # check first square
-            in_check1, _, _ = check_function(temp_white_king_pos1, temp_black_king_pos1)
-            
-            # check destination square
-            temp_white_king_pos2 = BoardCoordinate(row, col+2) if ally_color == 'w' else white_king_pos
-            temp_black_king_pos2 = BoardCoordinate(row, col+2) if ally_color == 'b' else black_king_pos
-            
-            in_check2, _, _ = check_function(temp_white_king_pos2, temp_black_king_pos2)
+            # (the square it passes through first, the destination only gets looked at if that one's safe)
+            is_white = ally_color == 'w'
+            if check_function(row, col+1, is_white) or check_function(row, col+2, is_white):
+                return
             
-            # if king doesn't pass through or end up in check, add the move
-            if not in_check1 and not in_check2:
-                moves.append(Move((row, col), (row, col+2), board, is_castle_move=True))
+            # king doesn't pass through or end up in check, add the move
+            moves.append(Move(row, col, row, col+2, board, is_castle_move=True))
     
     @staticmethod
     def get_queenside_castle_move(row: int, col: int, moves: List[Move], board, ally_color: str,
-                                check_function=None, white_king_pos=None, black_king_pos=None):
+                                check_function=None):
         """Generate queenside castling move if legal"""
         # check if squares between king and rook are empty
-        if board[row][col-1] == NULL_SQUARE and board[row][col-2] == NULL_SQUARE and board[row][col-3] == NULL_SQUARE:
+        # (read off the flat board, 0 is an empty square)
+        sq = row * 8 + col
+        board_flat = board.board_flat
+        if not board_flat[sq - 1] and not board_flat[sq - 2] and not board_flat[sq - 3]:
             # if no check function provided, we can't verify safety
             if not check_function:
-                moves.append(Move((row, col), (row, col-2), board, is_castle_move=True))
+                moves.append(Move(row, col, row, col-2, board, is_castle_move=True))
                 return
                 
             # check if king passes through or ends up in check
-            # create temporary positions for checking
-            temp_white_king_pos1 = BoardCoordinate(row, col-1) if ally_color == 'w' else white_king_pos
-            temp_black_king_pos1 = BoardCoordinate(row, col-1) if ally_color == 'b' else black_king_pos
-            
-            # check first square
-            in_check1, _, _ = check_function(temp_white_king_pos1, temp_black_king_pos1)
-            
-            # check destination square
-            temp_white_king_pos2 = BoardCoordinate(row, col-2) if ally_color == 'w' else white_king_pos
-            temp_black_king_pos2 = BoardCoordinate(row, col-2) if ally_color == 'b' else black_king_pos
-            
-            in_check2, _, _ = check_function(temp_white_king_pos2, temp_black_king_pos2)
+            # (the square it passes through first, the destination only gets looked at if that one's safe)
+            is_white = ally_color == 'w'
+            if check_function(row, col-1, is_white) or check_function(row, col-2, is_white):
+                return
             
-            # if king doesn't pass through or end up in check, add the move
-            if not in_check1 and not in_check2:
-                moves.append(Move((row, col), (row, col-2), board, is_castle_move=True))
+            # king doesn't pass through or end up in check, add the move
+            moves.append(Move(row, col, row, col-2, board, is_castle_move=True))
@@ -1,18 +1,81 @@
 from __future__ import annotations
 from typing import List, Tuple, Dict, Set, Optional
 from abc import ABC, abstractmethod
+from array import array
 
-from ESAP_chess_core import BoardCoordinate, PieceColor, PieceType, NULL_SQUARE, ChessMatrix
+from ESAP_chess_core import BoardCoordinate, PieceColor, PieceType, NULL_SQUARE, ChessMatrix, Position, ChessBoard
 from ESAP_chess_moves import Move
+from ESAP_movegen import gen_pawn, FLAG_ENPASSANT, FLAT_CODES
+from ESAP_bitboards import rook_attacks, bishop_attacks, queen_attacks, KNIGHT_ATTACKS, KING_ATTACKS, LINE
 
-# direction constants
+# direction constants (tuples, built once at import and never copied)
+STRAIGHT_DIRECTIONS = ((0, 1), (1, 0), (0, -1), (-1, 0))  # rook directions
+DIAGONAL_DIRECTIONS = ((1, 1), (1, -1), (-1, -1), (-1, 1))  # bishop directions
+KNIGHT_DIRECTIONS = ((-2, -1), (-1, -2), (1, -2), (2, -1), (2, 1), (1, 2), (-1, 2), (-2, 1))  # knight moves
+KING_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, 1), (1, -1), (-1, 1))  # king moves
 DIRECTIONS = {
-    "straight": [(0, 1), (1, 0), (0, -1), (-1, 0)],  # rook directions
-    "diagonal": [(1, 1), (1, -1), (-1, -1), (-1, 1)],  # bishop directions
-    "knight": [(-2, -1), (-1, -2), (1, -2), (2, -1), (2, 1), (1, 2), (-1, 2), (-2, 1)],  # knight moves
-    "king": [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, 1), (1, -1), (-1, 1)]  # king moves
+    "straight": STRAIGHT_DIRECTIONS,
+    "diagonal": DIAGONAL_DIRECTIONS,
+    "knight": KNIGHT_DIRECTIONS,
+    "king": KING_DIRECTIONS
 }
 
+# the rook, knight, bishop and king strategies work off the board's bitboards (ChessMatrix.piece_bb / occ_*):
+# one table or magic lookup gives every target square, so there are no ray loops or bounds checks
+
+def add_target_moves(moves: List[Move], r: int, c: int, targets: int, board: ChessBoard) -> None:
+    """Append a Move from (r, c) to every square in a target bitboard (lowest square first)
+    
+    The end square is split with a shift and a mask, no coordinate objects or tuples are built per target.
+    """
+    while targets:
+        end_sq = (targets & -targets).bit_length() - 1
+        targets &= targets - 1
+        moves.append(Move(r, c, end_sq >> 3, end_sq & 7, board))
+
+def pin_line_mask(sq: int, pin_direction: Tuple[int, int]) -> int:
+    """Squares on the line through sq along a pin direction, where a pinned slider can still go"""
+    return LINE[sq][sq + pin_direction[0] * 8 + pin_direction[1]]
+
+# flat board codes of the pieces that can attack along a rank, by color
+RANK_ATTACKER_CODES = {
+    'w': (FLAT_CODES["wR"], FLAT_CODES["wQ"]),
+    'b': (FLAT_CODES["bR"], FLAT_CODES["bQ"])
+}
+
+def enpassant_is_legal(board: ChessBoard, r: int, c: int, capture_col: int, king_row: int, king_col: int,
+                       enemy_color: str) -> bool:
+    """Check that an en passant capture from (r, c) onto capture_col doesn't expose the king along its rank
+    
+    En passant takes two pawns off the rank at once (the capturing one and the captured one),
+    so a rook or queen behind them could suddenly see the king.
+    """
+    if king_row != r:
+        return True
+    
+    attacking_piece = blocking_piece = False
+    low, high = min(c, capture_col), max(c, capture_col)  # the capturing pawn and the captured one
+    if king_col < low:
+        inside_range = range(king_col + 1, low)
+        outside_range = range(high + 1, 8)
+    else:
+        inside_range = range(high + 1, king_col)
+        outside_range = range(low - 1, -1, -1)
+    # the rank is read off the flat board, one byte per square and 0 for empty
+    board_flat = board.board_flat
+    row_start = r * 8
+    enemy_rook, enemy_queen = RANK_ATTACKER_CODES[enemy_color]
+    for i in inside_range:
+        if board_flat[row_start + i]:
+            blocking_piece = True
+    for i in outside_range:
+        code = board_flat[row_start + i]
+        if code == enemy_rook or code == enemy_queen:
+            attacking_piece = True
+        elif code:
+            blocking_piece = True
+    return not attacking_piece or blocking_piece
+
 # alphabet soup
 # is yummy
 # (it says ABC that was the joke) 
@@ -21,24 +84,25 @@ class PieceMovementStrategy(ABC):
     """abstract base class for piece movement strategies"""
     
     @abstractmethod
-    def get_moves(self, position: Position, board: ChessBoard, pins: List, is_white_turn: bool) -> List[Move]:
-        """get all possible moves for a piece at the given position"""
+    def get_moves(self, position: Position, board: ChessBoard, pins: Dict[int, Tuple[int, int]], is_white_turn: bool) -> List[Move]:
+        """get all possible moves for a piece at the given position
+        
+        pins maps the square index of each pinned piece to its pin direction (row, col step).
+        """
         pass
 
 class PawnMovementStrategy(PieceMovementStrategy):
-    def get_moves(self, position: Position, board: ChessBoard, pins: List, is_white_turn: bool, enpassant_target: Optional[Position] = None, white_king_position: Optional[Position] = None, black_king_position: Optional[Position] = None) -> List[Move]:
+    # scratch space for gen_pawn, a pawn never has more than four moves
+    move_buffer = array("I", [0]) * 4
+    
+    def get_moves(self, position: Position, board: ChessBoard, pins: Dict[int, Tuple[int, int]], is_white_turn: bool, enpassant_target: Optional[Position] = None, white_king_position: Optional[Position] = None, black_king_position: Optional[Position] = None) -> List[Move]:
         """get all possible moves for a pawn"""
         moves = []
         r, c = position.row, position.col
         
         # check if pawn is pinned
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(pins) - 1, -1, -1):
-            if pins[i][0] == r and pins[i][1] == c:
-                piece_pinned = True
-                pin_direction = (pins[i][2], pins[i][3])
-                break
+        pin_direction = pins.get(r * 8 + c)
+        piece_pinned = pin_direction is not None
         
         # get king position for en passant checks
         if is_white_turn and white_king_position:
@@ -49,306 +113,157 @@ class PawnMovementStrategy(PieceMovementStrategy):
             # default values if king positions aren't provided
             king_row, king_col = (7, 4) if is_white_turn else (0, 4)
         
-        if is_white_turn:  # white pawn moves
-            # forward moves
-            if board[r-1][c] == NULL_SQUARE:
-                if not piece_pinned or pin_direction == (-1, 0):
-                    moves.append(Move((r, c), (r-1, c), board))
-                    if r == 6 and board[r-2][c] == NULL_SQUARE:
-                        moves.append(Move((r, c), (r-2, c), board))
-            
-            # captures to the left (this is the simplest way i could implement this it looks awful but idc it works so DONT touch this code)
-            if c-1 >= 0:
-                if board[r-1][c-1][0] == "b":
-                    if not piece_pinned or pin_direction == (-1, -1):
-                        moves.append(Move((r, c), (r-1, c-1), board))
-                elif enpassant_target and (r-1, c-1) == (enpassant_target.row, enpassant_target.col):
-                    attacking_piece = blocking_piece = False
-                    if king_row == r:
-                        if king_col < c:
-                            inside_range = range(king_col + 1, c-1)
-                            outside_range = range(c+1, 8)
-                        else:
-                            inside_range = range(king_col - 1, c, -1)
-                            outside_range = range(c-2, -1, -1)
-                        for i in inside_range:
-                            if board[r][i] != NULL_SQUARE:
-                                blocking_piece = True
-                        for i in outside_range:
-                            square = board[r][i]
-                            if square[0] == 'b' and (square[1] == 'R' or square[1] == 'Q'):
-                                attacking_piece = True
-                            elif square != NULL_SQUARE:
-                                blocking_piece = True
-                    if not attacking_piece or blocking_piece:
-                        moves.append(Move((r, c), (r-1, c-1), board, is_enpassant_move=True))
-            
-            # captures to the right
-            if c+1 <= 7:
-                if board[r-1][c+1][0] == "b":
-                    if not piece_pinned or pin_direction == (-1, 1):
-                        moves.append(Move((r, c), (r-1, c+1), board))
-                elif enpassant_target and (r-1, c+1) == (enpassant_target.row, enpassant_target.col):
-                    attacking_piece = blocking_piece = False
-                    if king_row == r:
-                        if king_col < c:
-                            inside_range = range(king_col + 1, c)
-                            outside_range = range(c+2, 8)
-                        else:
-                            inside_range = range(king_col - 1, c+1, -1)
-                            outside_range = range(c-1, -1, -1)
-                        for i in inside_range:
-                            if board[r][i] != NULL_SQUARE:
-                                blocking_piece = True
-                        for i in outside_range:
-                            square = board[r][i]
-                            if square[0] == 'b' and (square[1] == 'R' or square[1] == 'Q'):
-                                attacking_piece = True
-                            elif square != NULL_SQUARE:
-                                blocking_piece = True
-                    if not attacking_piece or blocking_piece:
-                        moves.append(Move((r, c), (r-1, c+1), board, is_enpassant_move=True))
-        else:  # black pawn moves
-            # forward moves
-            if board[r+1][c] == NULL_SQUARE:
-                if not piece_pinned or pin_direction == (1, 0):
-                    moves.append(Move((r, c), (r+1, c), board))
-                    if r == 1 and board[r+2][c] == NULL_SQUARE:
-                        moves.append(Move((r, c), (r+2, c), board))
+        enemy_color = 'b' if is_white_turn else 'w'
+        step = -1 if is_white_turn else 1  # row direction the pawn moves in
+        ep_sq = enpassant_target.row * 8 + enpassant_target.col if enpassant_target else -1
+        
+        # the pushes and captures themselves come from the flat board kernel (forward, double, left, right)
+        buffer = self.move_buffer
+        n = gen_pawn(board.board_flat, r * 8 + c, is_white_turn, ep_sq, buffer, 0)
+        for k in range(n):
+            packed = buffer[k]
+            end_sq = (packed >> 6) & 63
+            end_row, end_col = end_sq >> 3, end_sq & 7
             
-            # captures to the left 
-            # this is the simplest way i could implement this it looks awful but idc it works so DONT touch this code
-            if c-1 >= 0:
-                if board[r+1][c-1][0] == "w":
-                    if not piece_pinned or pin_direction == (1, -1):
-                        moves.append(Move((r, c), (r+1, c-1), board))
-                elif enpassant_target and (r+1, c-1) == (enpassant_target.row, enpassant_target.col):
-                    attacking_piece = blocking_piece = False
-                    if king_row == r:
-                        if king_col < c:
-                            inside_range = range(king_col + 1, c-1)
-                            outside_range = range(c+1, 8)
-                        else:
-                            inside_range = range(king_col - 1, c, -1)
-                            outside_range = range(c-2, -1, -1)
-                        for i in inside_range:
-                            if board[r][i] != NULL_SQUARE:
-                                blocking_piece = True
-                        for i in outside_range:
-                            square = board[r][i]
-                            if square[0] == 'w' and (square[1] == 'R' or square[1] == 'Q'):
-                                attacking_piece = True
-                            elif square != NULL_SQUARE:
-                                blocking_piece = True
-                    if not attacking_piece or blocking_piece:
-                        moves.append(Move((r, c), (r+1, c-1), board, is_enpassant_move=True))
+            if not (packed >> 12) & FLAG_ENPASSANT:
+                # a pinned pawn can only move along its pin
+                if not piece_pinned or pin_direction == (step, end_col - c):
+                    moves.append(Move(r, c, end_row, end_col, board))
+                continue
             
-            # captures to the right
-            if c+1 <= 7:
-                if board[r+1][c+1][0] == "w":
-                    if not piece_pinned or pin_direction == (1, 1):
-                        moves.append(Move((r, c), (r+1, c+1), board))
-                elif enpassant_target and (r+1, c+1) == (enpassant_target.row, enpassant_target.col):
-                    attacking_piece = blocking_piece = False
-                    if king_row == r:
-                        if king_col < c:
-                            inside_range = range(king_col + 1, c)
-                            outside_range = range(c+2, 8)
-                        else:
-                            inside_range = range(king_col - 1, c+1, -1)
-                            outside_range = range(c-1, -1, -1)
-                        for i in inside_range:
-                            if board[r][i] != NULL_SQUARE:
-                                blocking_piece = True
-                        for i in outside_range:
-                            square = board[r][i]
-                            if square[0] == 'w' and (square[1] == 'R' or square[1] == 'Q'):
-                                attacking_piece = True
-                            elif square != NULL_SQUARE:
-                                blocking_piece = True
-                    if not attacking_piece or blocking_piece:
-                        moves.append(Move((r, c), (r+1, c+1), board, is_enpassant_move=True))
+            if enpassant_is_legal(board, r, c, end_col, king_row, king_col, enemy_color):
+                moves.append(Move(r, c, end_row, end_col, board, is_enpassant_move=True))
         
         return moves
 
 class RookMovementStrategy(PieceMovementStrategy):
-    def get_moves(self, position: Position, board: ChessBoard, pins: List, is_white_turn: bool) -> List[Move]:
+    def get_moves(self, position: Position, board: ChessBoard, pins: Dict[int, Tuple[int, int]], is_white_turn: bool) -> List[Move]:
         """get all possible moves for a rook"""
         moves = []
         r, c = position.row, position.col
         
         # check if rook is pinned
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(pins) - 1, -1, -1):
-            if pins[i][0] == r and pins[i][1] == c:
-                piece_pinned = True
-                pin_direction = (pins[i][2], pins[i][3])
-                if board[r][c][1] != 'Q':  # Don't remove pin if it's a queen wahahahah :evil:
-                    pins.remove(pins[i])
-                break
-        
-        # determine enemy color
-        enemy_color = 'b' if is_white_turn else 'w'
+        pin_direction = pins.get(r * 8 + c)
+        piece_pinned = pin_direction is not None
         
-        # check moves in all four straight directions
-        for d in DIRECTIONS["straight"]:
-            for i in range(1, 8):
-                end_row = r + d[0] * i
-                end_col = c + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    if not piece_pinned or pin_direction == d or pin_direction == (-d[0], -d[1]):
-                        end_piece = board[end_row][end_col]
-                        if end_piece == NULL_SQUARE:
-                            moves.append(Move((r, c), (end_row, end_col), board))
-                        elif end_piece[0] == enemy_color:
-                            moves.append(Move((r, c), (end_row, end_col), board))
-                            break
-                        else:  # friendly piece
-                            break
-                else:  # off board
-                    break
+        # every square along the four straight rays up to and including the first piece, minus our own pieces
+        sq = r * 8 + c
+        own = board.occ_white if is_white_turn else board.occ_black
+        targets = rook_attacks(sq, board.occ_white | board.occ_black) & ~own
+        if piece_pinned:  # a pinned piece only slides along its pin
+            targets &= pin_line_mask(sq, pin_direction)
+        add_target_moves(moves, r, c, targets, board)
         
         return moves
 
 class KnightMovementStrategy(PieceMovementStrategy):
-    def get_moves(self, position: Position, board: ChessBoard, pins: List, is_white_turn: bool) -> List[Move]:
+    def get_moves(self, position: Position, board: ChessBoard, pins: Dict[int, Tuple[int, int]], is_white_turn: bool) -> List[Move]:
         """get all possible moves for a knight"""
         moves = []
         r, c = position.row, position.col
         
         # check if knight is pinned
-        piece_pinned = False
-        for i in range(len(pins) - 1, -1, -1):
-            if pins[i][0] == r and pins[i][1] == c:
-                piece_pinned = True
-                pins.remove(pins[i])
-                break
+        piece_pinned = r * 8 + c in pins
         
         # Knights can't move if pinned (no WAyayayay)
         if piece_pinned:
             return moves
         
-        # determine ally color
-        ally_color = 'w' if is_white_turn else 'b'
-        
-        # check all possible knight moves
-        for d in DIRECTIONS["knight"]:
-            end_row = r + d[0]
-            end_col = c + d[1]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = board[end_row][end_col]
-                if end_piece[0] != ally_color:  # Empty or enemy piece
-                    moves.append(Move((r, c), (end_row, end_col), board))
+        # all knight jumps that don't land on our own pieces
+        own = board.occ_white if is_white_turn else board.occ_black
+        add_target_moves(moves, r, c, KNIGHT_ATTACKS[r * 8 + c] & ~own, board)
         
         return moves
 
 class BishopMovementStrategy(PieceMovementStrategy):
-    def get_moves(self, position: Position, board: ChessBoard, pins: List, is_white_turn: bool) -> List[Move]:
+    def get_moves(self, position: Position, board: ChessBoard, pins: Dict[int, Tuple[int, int]], is_white_turn: bool) -> List[Move]:
         """get all possible moves for a bishop"""
         moves = []
         r, c = position.row, position.col
         
         # check if bishop is pinned
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(pins) - 1, -1, -1):
-            if pins[i][0] == r and pins[i][1] == c:
-                piece_pinned = True
-                pin_direction = (pins[i][2], pins[i][3])
-                pins.remove(pins[i])
-                break
+        pin_direction = pins.get(r * 8 + c)
+        piece_pinned = pin_direction is not None
         
-        # determine enemy color
-        enemy_color = 'b' if is_white_turn else 'w'
-        
-        # check moves in all four diagonal directions
-        for d in DIRECTIONS["diagonal"]:
-            for i in range(1, 8):
-                end_row = r + d[0] * i
-                end_col = c + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    if not piece_pinned or pin_direction == d or pin_direction == (-d[0], -d[1]):
-                        end_piece = board[end_row][end_col]
-                        if end_piece == NULL_SQUARE:
-                            moves.append(Move((r, c), (end_row, end_col), board))
-                        elif end_piece[0] == enemy_color:
-                            moves.append(Move((r, c), (end_row, end_col), board))
-                            break
-                        else:  # friendly piece
-                            break
-                else:  # off board
-                    break
+        # every square along the four diagonals up to and including the first piece, minus our own pieces
+        sq = r * 8 + c
+        own = board.occ_white if is_white_turn else board.occ_black
+        targets = bishop_attacks(sq, board.occ_white | board.occ_black) & ~own
+        if piece_pinned:  # a pinned piece only slides along its pin
+            targets &= pin_line_mask(sq, pin_direction)
+        add_target_moves(moves, r, c, targets, board)
         
         return moves
 
 class QueenMovementStrategy(PieceMovementStrategy):
-    def get_moves(self, position: Position, board: ChessBoard, pins: List, is_white_turn: bool) -> List[Move]:
-        """get all possible moves for a queen (combines rook and bishop moves)"""
+    def get_moves(self, position: Position, board: ChessBoard, pins: Dict[int, Tuple[int, int]], is_white_turn: bool) -> List[Move]:
+        """get all possible moves for a queen (rook and bishop moves in one lookup)"""
         moves = []
+        r, c = position.row, position.col
         
-        # use rook and bishop strategies to get queen moves
-        rook_strategy = RookMovementStrategy()
-        bishop_strategy = BishopMovementStrategy()
+        # check if queen is pinned
+        pin_direction = pins.get(r * 8 + c)
+        piece_pinned = pin_direction is not None
         
-        moves.extend(rook_strategy.get_moves(position, board, pins, is_white_turn))
-        moves.extend(bishop_strategy.get_moves(position, board, pins, is_white_turn))
+        # every square along all eight rays up to and including the first piece, minus our own pieces
+        sq = r * 8 + c
+        own = board.occ_white if is_white_turn else board.occ_black
+        targets = queen_attacks(sq, board.occ_white | board.occ_black) & ~own
+        if piece_pinned:  # a pinned piece only slides along its pin
+            targets &= pin_line_mask(sq, pin_direction)
+        add_target_moves(moves, r, c, targets, board)
         
         return moves
 
 class KingMovementStrategy(PieceMovementStrategy):
-    def get_moves(self, position: Position, board: ChessBoard, pins: List, is_white_turn: bool, 
-                  white_king_position: Optional[Position] = None, black_king_position: Optional[Position] = None,
-                  check_for_checks_func=None) -> List[Move]:
-        """get all possible moves for a king"""
+    def get_moves(self, position: Position, board: ChessBoard, pins: Dict[int, Tuple[int, int]], is_white_turn: bool, 
+                  check_for_checks_func=None, unsafe_squares: int = 0) -> List[Move]:
+        """get all possible moves for a king
+        
+        check_for_checks_func(row, col, is_white) returns True if the king of that color
+        would be in check standing on (row, col), so each destination can be tried out.
+        unsafe_squares is a bitboard of squares already known to be attacked, those get
+        dropped up front without trying them.
+        """
         moves = []
         r, c = position.row, position.col
         
-        # determine ally color
-        ally_color = 'w' if is_white_turn else 'b'
+        # the eight neighbouring squares that don't hold our own pieces (or known attacked ones)
+        own = board.occ_white if is_white_turn else board.occ_black
+        targets = KING_ATTACKS[r * 8 + c] & ~(own | unsafe_squares)
+        
+        # if we don't have the check function, just add the moves
+        # (the game state will filter unsafe moves later)
+        if not check_for_checks_func:
+            add_target_moves(moves, r, c, targets, board)
+            return moves
         
-        # check all eight directions
-        for d in DIRECTIONS["king"]:
-            end_row = r + d[0]
-            end_col = c + d[1]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = board[end_row][end_col]
-                if end_piece[0] != ally_color:  # empty or enemy piece
-                    # if we have the check function, use it to verify move safety
-                    if check_for_checks_func:
-                        # create temporary positions for checking
-                        temp_white_king_pos = BoardCoordinate(end_row, end_col) if is_white_turn else white_king_position
-                        temp_black_king_pos = BoardCoordinate(end_row, end_col) if not is_white_turn else black_king_position
-                        
-                        # check if the move puts the king in check
-                        in_check, _, _ = check_for_checks_func(temp_white_king_pos, temp_black_king_pos)
-                    
-                        # add move if it doesn't put the king in check
-                        if not in_check:
-                            moves.append(Move((r, c), (end_row, end_col), board))
-                    else:
-                        # if we don't have the check function, just add the move
-                        # (the game state will filter unsafe moves later)
-                        moves.append(Move((r, c), (end_row, end_col), board))
+        while targets:
+            end_sq = (targets & -targets).bit_length() - 1
+            targets &= targets - 1
+            end_row, end_col = end_sq >> 3, end_sq & 7
+            # add move if it doesn't put the king in check
+            if not check_for_checks_func(end_row, end_col, is_white_turn):
+                moves.append(Move(r, c, end_row, end_col, board))
         
         return moves
 
+# one instance of each strategy, they hold no per-game state so every board can share them
+MOVEMENT_STRATEGIES = {
+    'p': PawnMovementStrategy(),
+    'R': RookMovementStrategy(),
+    'N': KnightMovementStrategy(),
+    'B': BishopMovementStrategy(),
+    'Q': QueenMovementStrategy(),
+    'K': KingMovementStrategy()
+}
+
 # factory to create the appropriate movement strategy for each piece type
 # named it this cuz i heard theres a game called factorio and its 1am so why not
 class PieceMovementFactory:
     @staticmethod
     def create_movement_strategy(piece_type: str) -> PieceMovementStrategy:
-        if piece_type == 'p':
-            return PawnMovementStrategy()
-        elif piece_type == 'R':
-            return RookMovementStrategy()
-        elif piece_type == 'N':
-            return KnightMovementStrategy()
-        elif piece_type == 'B':
-            return BishopMovementStrategy()
-        elif piece_type == 'Q':
-            return QueenMovementStrategy()
-        elif piece_type == 'K':
-            return KingMovementStrategy()
-        else:
+        strategy = MOVEMENT_STRATEGIES.get(piece_type)
+        if strategy is None:
             raise ValueError(f"Unknown piece type: {piece_type}")
+        return strategy
@@ -2,7 +2,6 @@ from __future__ import annotations
 from dataclasses import dataclass, field
 from enum import Enum, auto, unique
 from typing import Dict, List, Tuple, Callable, Optional, Set, Union, TypeVar, Generic, Any
-import copy
 import random
 
 import ESAP_minimax_math
@@ -11,6 +10,10 @@ import ESAP_minimax_math
 CHESS_DIMENSION = 8  # 8x8 chess board... because duh lol
 NULL_SQUARE = "--"   # representation of an empty square
 
+# algebraic square names by row * 8 + col ("a8" is 0, "h1" is 63) and the reverse lookup, built once
+SQUARE_NAMES = tuple(file + rank for rank in "87654321" for file in "abcdefgh")
+SQUARE_INDEX = {name: index for index, name in enumerate(SQUARE_NAMES)}
+
 # type definitions for improved code clarity
 SquareContent = str  # a string representing piece on a square (like  wp for white pawn)
 BoardMatrix = List[List[SquareContent]]  # 2d representation of the chess board
@@ -84,18 +87,11 @@ class BoardCoordinate:
         Raises:
             ValueError: If the notation is invalid
         """
-        # mapping from algebraic notation to internal representation
-        file_mapping = {"a": 0, "b": 1, "c": 2, "d": 3, "e": 4, "f": 5, "g": 6, "h": 7}
-        rank_mapping = {"1": 7, "2": 6, "3": 5, "4": 4, "5": 3, "6": 2, "7": 1, "8": 0}
-        
-        if len(notation) != 2:
-            raise ValueError(f"Invalid algebraic notation: {notation}")
-        
-        file_char, rank_char = notation[0].lower(), notation[1]
-        if file_char not in file_mapping or rank_char not in rank_mapping:
+        index = SQUARE_INDEX.get(notation.lower())
+        if index is None:
             raise ValueError(f"Invalid algebraic notation: {notation}")
             
-        return cls(rank_mapping[rank_char], file_mapping[file_char])
+        return cls(index >> 3, index & 7)
     
     def to_algebraic(self) -> str:
         """Convert the coordinate to algebraic chess notation (e.g., 'e4')
@@ -103,10 +99,7 @@ class BoardCoordinate:
         Returns:
             A string in algebraic chess notation
         """
-        file_mapping = {0: "a", 1: "b", 2: "c", 3: "d", 4: "e", 5: "f", 6: "g", 7: "h"}
-        rank_mapping = {7: "1", 6: "2", 5: "3", 4: "4", 3: "5", 2: "6", 1: "7", 0: "8"}
-        
-        return file_mapping[self.file] + rank_mapping[self.rank]
+        return SQUARE_NAMES[self.rank * CHESS_DIMENSION + self.file]
         
     @property
     def row(self) -> int:
@@ -260,7 +253,8 @@ class ChessAction:
     get_chess_notation = to_algebraic_notation
 
 # castling privileges management
-@dataclass
+# (slots so there's no per-instance __dict__, the history keeps the packed 4-bit form instead of objects)
+@dataclass(slots=True)
 class CastlingPrivileges:
     """tracks the castling rights for both players
     
@@ -289,6 +283,15 @@ class CastlingPrivileges:
     @property
     def black_queenside(self) -> bool:
         return self.bqs
+    
+    def to_bits(self) -> int:
+        """pack the rights into a 4-bit int (1 white kingside, 2 white queenside, 4 black kingside, 8 black queenside)"""
+        return self.wks | self.wqs << 1 | self.bks << 2 | self.bqs << 3
+    
+    @classmethod
+    def from_bits(cls, bits: int) -> CastlingPrivileges:
+        """unpack a 4-bit castling rights int made by to_bits"""
+        return cls(bool(bits & 1), bool(bits & 2), bool(bits & 4), bool(bits & 8))
 
 # chess board representation and management
 class ChessMatrix:
@@ -452,12 +455,8 @@ class ChessGameState:
         
         # castling rights tracking
         self.castling_rights = CastlingPrivileges(True, True, True, True)
-        self.castling_rights_history = [CastlingPrivileges(
-            self.castling_rights.wks,
-            self.castling_rights.wqs,
-            self.castling_rights.bks,
-            self.castling_rights.bqs
-        )]
+        # packed 4-bit ints (CastlingPrivileges.to_bits), no object per move
+        self.castling_rights_history = [self.castling_rights.to_bits()]
         
         # position repetition tracking for threefold repetition rule
         self.position_history = {}
@@ -653,13 +652,7 @@ class ChessGameState:
         
         # restore previous castling rights to proceed
         self.castling_rights_history.pop()
-        previous_rights = self.castling_rights_history[-1]
-        self.castling_rights = CastlingPrivileges(
-            previous_rights.wks,
-            previous_rights.wqs,
-            previous_rights.bks,
-            previous_rights.bqs
-        )
+        self.castling_rights = CastlingPrivileges.from_bits(self.castling_rights_history[-1])
         
         # handle castle move reversal
         if last_action.castling:
@@ -739,12 +732,7 @@ class ChessGameState:
                     self.castling_rights.bks = False
                     
         # record the updated castling rights in the history
-        self.castling_rights_history.append(CastlingPrivileges(
-            self.castling_rights.wks,
-            self.castling_rights.wqs,
-            self.castling_rights.bks,
-            self.castling_rights.bqs
-        ))
+        self.castling_rights_history.append(self.castling_rights.to_bits())
         
     updateCastleRight = update_castling_privileges
             
@@ -803,10 +791,10 @@ class ChessGameState:
                             break
                 
                 # filter moves: only keep king moves and moves that block/capture the checking piece
-                for i in range(len(legal_moves) - 1, -1, -1):
-                    if legal_moves[i].moving_piece[1] != 'K':
-                        if (legal_moves[i].destination.rank, legal_moves[i].destination.file) not in valid_target_squares:
-                            legal_moves.remove(legal_moves[i])
+                # (one pass building a new list, list.remove rescanned the list for every dropped move)
+                legal_moves = [move for move in legal_moves
+                               if move.moving_piece[1] == 'K'
+                               or (move.destination.rank, move.destination.file) in valid_target_squares]
             
             # double check: only king moves are legal
             else:
@@ -1771,6 +1759,8 @@ class CastlingRights:
         bks: Black kingside castling right
         bqs: Black queenside castling right
     """
+    __slots__ = ("wks", "wqs", "bks", "bqs")
+    
     def __init__(self, white_kingside=True, white_queenside=True, black_kingside=True, black_queenside=True):
         """Initialize castling rights
         
@@ -179,7 +179,7 @@ def main():
                     if len(player_clicks) == 2:
                         start_pos = BoardCoordinate(player_clicks[0][0], player_clicks[0][1])
                         end_pos = BoardCoordinate(player_clicks[1][0], player_clicks[1][1])
-                        move = Move(start_pos, end_pos, game_state.board)
+                        move = Move.from_positions(start_pos, end_pos, game_state.board)
                         if move in valid_moves:
                             move = valid_moves[valid_moves.index(move)]
                             move_start_time = time.time()
@@ -3,6 +3,8 @@ import random
 import time
 from dataclasses import dataclass
 
+from ESAP_chess_moves import MoveGenerator
+
 CHECKMATE_VALUE = 100000
 STALEMATE_VALUE = 0
 SEARCH_DEPTH = 3 # Very important value! Makes the bot stronger or weaker
@@ -186,6 +188,15 @@ def find_best_move(game_state: Any, valid_moves: List[Any]) -> Any:
 
 # For more about minimax refer to our write-up
 
+def leaf_moves(game_state: Any) -> List[Any]:
+    """Moves to hand to a leaf of the search (depth 0), which never looks at them
+    
+    The leaf still needs checkmate / stalemate set, so this stops at the first legal move
+    instead of generating all of them.
+    """
+    game_state.has_valid_moves()
+    return []
+
 def minimax_search(game_state: Any, valid_moves: List[Any], depth: int, alpha: int, beta: int, is_white_turn: bool) -> int:
     """Recursive minimax search with alpha-beta pruning.
     
@@ -207,8 +218,10 @@ def minimax_search(game_state: Any, valid_moves: List[Any], depth: int, alpha: i
     if depth == 0 or game_state.checkmate or game_state.stalemate:
         return evaluate_position(game_state)
     
-    # Randomize move order for better pruning
+    # Randomize move order for better pruning, then try captures first (best victim, cheapest attacker)
+    # so alpha-beta finds the good lines early, the shuffle still mixes up equal moves
     random.shuffle(valid_moves)
+    MoveGenerator.order_moves(valid_moves)
     
     if is_white_turn:
         # maximizing player (white)
@@ -217,7 +230,7 @@ def minimax_search(game_state: Any, valid_moves: List[Any], depth: int, alpha: i
         for move in valid_moves:
             # make the move
             game_state.make_move(move)
-            next_moves = game_state.get_valid_moves()
+            next_moves = leaf_moves(game_state) if depth == 1 else game_state.get_valid_moves()
             
             # recursive evaluation
             score = minimax_search(game_state, next_moves, depth - 1, alpha, beta, False)
@@ -244,7 +257,7 @@ def minimax_search(game_state: Any, valid_moves: List[Any], depth: int, alpha: i
         for move in valid_moves:
             # make the move
             game_state.make_move(move)
-            next_moves = game_state.get_valid_moves()
+            next_moves = leaf_moves(game_state) if depth == 1 else game_state.get_valid_moves()
             
             # recursive evaluation!! this is the project requirement right here !!
             score = minimax_search(game_state, next_moves, depth - 1, alpha, beta, True)
@@ -288,33 +301,33 @@ def evaluate_position(game_state: Any) -> int:
     # material and positional evaluation
     total_score = 0
     
-    # iterate through the board (no duh)
-    for row in range(8):
-        for col in range(8):
-            square = game_state.board[row][col]
-            
-            # skip empty squares
-            if square == "--":
-                continue
-                
-            # calculate positional bonus
-            positional_bonus = 0
-            piece_type = square[1]
-            color = square[0]
-            
-            # skip kings for positional evaluation cuz theyre always there
-            if piece_type != "K":
-                # handle pawns specially cuz they have different tables
-                if piece_type == "p":
-                    positional_bonus = position_tables[square][row][col]
-                else:
-                    positional_bonus = position_tables[piece_type][row][col]
-            
-            # add material and positioning value based on piece color
-            if color == 'w':
-                total_score += position_values.material_values[piece_type] + positional_bonus
-            elif color == 'b':
-                total_score -= position_values.material_values[piece_type] + positional_bonus
+    # iterate through the occupied squares only (the board keeps an occupancy bitboard, so empty squares are never visited)
+    board = game_state.board
+    occupied = board.occ_all
+    while occupied:
+        sq = (occupied & -occupied).bit_length() - 1
+        occupied &= occupied - 1
+        row, col = sq >> 3, sq & 7
+        square = board[row][col]
+        
+        # calculate positional bonus
+        positional_bonus = 0
+        piece_type = square[1]
+        color = square[0]
+        
+        # skip kings for positional evaluation cuz theyre always there
+        if piece_type != "K":
+            # handle pawns specially cuz they have different tables
+            if piece_type == "p":
+                positional_bonus = position_tables[square][row][col]
+            else:
+                positional_bonus = position_tables[piece_type][row][col]
+        
+        # add material and positioning value based on piece color
+        if color == 'w':
+            total_score += position_values.material_values[piece_type] + positional_bonus
+        elif color == 'b':
+            total_score -= position_values.material_values[piece_type] + positional_bonus
     
     return total_score
 
@@ -0,0 +1,362 @@
+from typing import Tuple
+
+# numba is optional, without it these kernels just run as plain Python
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit that leaves the function as it is"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+# flat board piece codes: 0 is empty, 1-6 are white p R N B Q K, 7-12 the same pieces for black
+# (this is the bitboard index from ESAP_algorithm plus one)
+EMPTY = 0
+PAWN = 1
+ROOK = 2
+KNIGHT = 3
+BISHOP = 4
+QUEEN = 5
+KING = 6
+
+# the usual two-character piece strings mapped to flat board codes
+FLAT_CODES = {"--": EMPTY}
+FLAT_CODES.update({color + piece: offset + code
+                   for color, offset in (("w", 0), ("b", 6))
+                   for piece, code in (("p", PAWN), ("R", ROOK), ("N", KNIGHT),
+                                       ("B", BISHOP), ("Q", QUEEN), ("K", KING))})
+
+# a packed move is one int: from | to << 6 | flags << 12 | promo << 16 | captured << 20 | moved << 24
+# (piece fields hold flat board codes, 0 means no promotion / no capture)
+FLAG_ENPASSANT = 1
+
+# buffer size for one position's moves (the most moves any chess position has is 218)
+MAX_MOVES = 256
+
+# (row, col) steps split into two tuples so numba sees plain integer tuples
+KNIGHT_DR = (-2, -1, 1, 2, 2, 1, -1, -2)
+KNIGHT_DC = (-1, -2, -2, -1, 1, 2, 2, 1)
+KING_DR = (-1, 1, 0, 0, -1, 1, 1, -1)
+KING_DC = (0, 0, -1, 1, -1, 1, -1, 1)
+ROOK_DR = (-1, 1, 0, 0)
+ROOK_DC = (0, 0, -1, 1)
+BISHOP_DR = (-1, 1, 1, -1)
+BISHOP_DC = (-1, 1, -1, 1)
+QUEEN_DR = ROOK_DR + BISHOP_DR
+QUEEN_DC = ROOK_DC + BISHOP_DC
+
+# directions out from the king in the order GameState reports pins and checks in
+# (orthogonal first, then diagonal), and the knight offsets in the same spirit
+PIN_DR = (-1, 0, 1, 0, -1, -1, 1, 1)
+PIN_DC = (0, -1, 0, 1, -1, 1, -1, 1)
+# the same directions as square index steps, and how many squares each ray from each square
+# runs before the board edge (index sq * 8 + direction), so the ray walk needs no bounds checks
+PIN_DELTA = tuple(d_row * 8 + d_col for d_row, d_col in zip(PIN_DR, PIN_DC))
+RAY_LENGTH = tuple(min(7 - r if d_row > 0 else r if d_row < 0 else 7,
+                       7 - c if d_col > 0 else c if d_col < 0 else 7)
+                   for r in range(8) for c in range(8) for d_row, d_col in zip(PIN_DR, PIN_DC))
+KNIGHT_CHECK_DR = (-2, -2, -1, -1, 1, 1, 2, 2)
+KNIGHT_CHECK_DC = (-1, 1, -2, 2, -2, 2, -1, 1)
+# square a knight jump lands on from each square, index sq * 8 + offset (-1 if it's off the board)
+KNIGHT_TARGETS = tuple((r + d_row) * 8 + c + d_col if 0 <= r + d_row < 8 and 0 <= c + d_col < 8 else -1
+                       for r in range(8) for c in range(8)
+                       for d_row, d_col in zip(KNIGHT_CHECK_DR, KNIGHT_CHECK_DC))
+
+# attacker bits for the pieces that can check along a ray from the king, indexed by flat code
+# (kings and pawns only from the adjacent square, knights never along a ray)
+ATTACKER_ROOK = 1
+ATTACKER_BISHOP = 2
+ATTACKER_QUEEN = 4
+ATTACKER_KING = 8
+ATTACKER_WHITE_PAWN = 16
+ATTACKER_BLACK_PAWN = 32
+ADJACENT_ONLY = ATTACKER_KING | ATTACKER_WHITE_PAWN | ATTACKER_BLACK_PAWN
+CODE_ATTACKER = (0,
+                 ATTACKER_WHITE_PAWN, ATTACKER_ROOK, 0, ATTACKER_BISHOP, ATTACKER_QUEEN, ATTACKER_KING,
+                 ATTACKER_BLACK_PAWN, ATTACKER_ROOK, 0, ATTACKER_BISHOP, ATTACKER_QUEEN, ATTACKER_KING)
+# which attackers can check along each PIN_DR/PIN_DC direction
+# (black pawns sit above the king, white pawns below it)
+ATTACKS_BY_DIR = (
+    (ATTACKER_ROOK | ATTACKER_QUEEN | ATTACKER_KING,) * 4 +
+    (ATTACKER_BISHOP | ATTACKER_QUEEN | ATTACKER_KING | ATTACKER_BLACK_PAWN,) * 2 +
+    (ATTACKER_BISHOP | ATTACKER_QUEEN | ATTACKER_KING | ATTACKER_WHITE_PAWN,) * 2
+)
+# the same masks split by distance, index direction * 2 + (distance > 1):
+# the adjacent square keeps the full mask, further out kings and pawns drop off
+ATTACK_MASKS = tuple(mask & ~ADJACENT_ONLY if far else mask
+                     for mask in ATTACKS_BY_DIR for far in (False, True))
+
+# slots in the pin / check buffers, four signed bytes (row, col, d_row, d_col) per entry
+MAX_PINS = 8
+MAX_CHECKS = 16
+
+@njit(cache=True)
+def pack_move(frm: int, to: int, flags: int = 0, promo: int = 0, captured: int = 0, moved: int = 0) -> int:
+    """Pack a move's fields into one int (see the layout above)"""
+    return frm | (to << 6) | (flags << 12) | (promo << 16) | (captured << 20) | (moved << 24)
+
+@njit(cache=True)
+def is_enemy(code: int, white: bool) -> bool:
+    """Check if a flat board code holds a piece of the side not moving"""
+    if white:
+        return code > KING
+    return EMPTY < code <= KING
+
+@njit(cache=True)
+def is_own(code: int, white: bool) -> bool:
+    """Check if a flat board code holds a piece of the side moving"""
+    if white:
+        return EMPTY < code <= KING
+    return code > KING
+
+@njit(cache=True)
+def gen_pawn(board, sq: int, white: bool, ep_sq: int, out, n: int) -> int:
+    """Write the pawn moves from sq into out starting at index n
+
+    Returns:
+        int: the new number of moves in out
+    """
+    c = sq & 7
+    step = -8 if white else 8
+    start_row = 6 if white else 1
+    moved = board[sq]
+    # a pawn one step from the last rank always promotes (to a queen, 4 codes after the pawn)
+    promo = moved + 4 if (sq >> 3) == (1 if white else 6) else 0
+
+    # forward moves
+    to = sq + step
+    if board[to] == EMPTY:
+        out[n] = pack_move(sq, to, 0, promo, 0, moved)
+        n += 1
+        if (sq >> 3) == start_row and board[to + step] == EMPTY:
+            out[n] = pack_move(sq, to + step, 0, 0, 0, moved)
+            n += 1
+
+    # captures to the left and right (en passant lands on the empty ep square)
+    enemy_pawn = PAWN + 6 if white else PAWN
+    if c > 0:
+        to = sq + step - 1
+        if is_enemy(board[to], white):
+            out[n] = pack_move(sq, to, 0, promo, board[to], moved)
+            n += 1
+        elif to == ep_sq:
+            out[n] = pack_move(sq, to, FLAG_ENPASSANT, 0, enemy_pawn, moved)
+            n += 1
+    if c < 7:
+        to = sq + step + 1
+        if is_enemy(board[to], white):
+            out[n] = pack_move(sq, to, 0, promo, board[to], moved)
+            n += 1
+        elif to == ep_sq:
+            out[n] = pack_move(sq, to, FLAG_ENPASSANT, 0, enemy_pawn, moved)
+            n += 1
+    return n
+
+@njit(cache=True)
+def gen_steps(board, sq: int, white: bool, d_rows, d_cols, out, n: int) -> int:
+    """Write the moves of a stepping piece (knight or king) from sq into out
+
+    Returns:
+        int: the new number of moves in out
+    """
+    r = sq >> 3
+    c = sq & 7
+    moved = board[sq]
+    for i in range(len(d_rows)):
+        end_row = r + d_rows[i]
+        end_col = c + d_cols[i]
+        if 0 <= end_row < 8 and 0 <= end_col < 8:
+            to = end_row * 8 + end_col
+            if not is_own(board[to], white):
+                out[n] = pack_move(sq, to, 0, 0, board[to], moved)
+                n += 1
+    return n
+
+@njit(cache=True)
+def gen_slider(board, sq: int, white: bool, d_rows, d_cols, out, n: int) -> int:
+    """Write the moves of a sliding piece (rook or bishop rays) from sq into out
+
+    Returns:
+        int: the new number of moves in out
+    """
+    r = sq >> 3
+    c = sq & 7
+    moved = board[sq]
+    for i in range(len(d_rows)):
+        end_row = r + d_rows[i]
+        end_col = c + d_cols[i]
+        while 0 <= end_row < 8 and 0 <= end_col < 8:
+            to = end_row * 8 + end_col
+            code = board[to]
+            if code == EMPTY:
+                out[n] = pack_move(sq, to, 0, 0, 0, moved)
+                n += 1
+            else:
+                if is_enemy(code, white):
+                    out[n] = pack_move(sq, to, 0, 0, code, moved)
+                    n += 1
+                break
+            end_row += d_rows[i]
+            end_col += d_cols[i]
+    return n
+
+@njit(cache=True)
+def gen_all_moves(board, white: bool, ep_sq: int, out) -> int:
+    """Write every pseudo-legal move of the side to move into out
+
+    Args:
+        board: 64 flat board codes (bytearray or uint8 array)
+        white: True if white is to move
+        ep_sq: en passant target square, or -1 if there is none
+        out: preallocated buffer of at least MAX_MOVES unsigned ints
+
+    Returns:
+        int: number of packed moves written to out
+    """
+    n = 0
+    offset = 0 if white else 6
+    for sq in range(64):
+        piece = board[sq] - offset
+        if piece < PAWN or piece > KING:
+            continue
+        if piece == PAWN:
+            n = gen_pawn(board, sq, white, ep_sq, out, n)
+        elif piece == ROOK:
+            n = gen_slider(board, sq, white, ROOK_DR, ROOK_DC, out, n)
+        elif piece == KNIGHT:
+            n = gen_steps(board, sq, white, KNIGHT_DR, KNIGHT_DC, out, n)
+        elif piece == BISHOP:
+            n = gen_slider(board, sq, white, BISHOP_DR, BISHOP_DC, out, n)
+        elif piece == QUEEN:
+            n = gen_slider(board, sq, white, QUEEN_DR, QUEEN_DC, out, n)
+        else:
+            n = gen_steps(board, sq, white, KING_DR, KING_DC, out, n)
+    return n
+
+@njit(cache=True)
+def find_pins_and_checks(board, king_sq: int, white: bool, pins, checks) -> Tuple[int, int]:
+    """Scan out from a king square for pins on the side to move and checks against it
+
+    Each pin or check is written as four entries (row, col, d_row, d_col): the
+    pinned piece or checking piece's square and the direction from the king
+    (the knight offset for knight checks). The side's own king is looked
+    through, so the square can be a king move that is only being tried out.
+
+    Args:
+        board: 64 flat board codes
+        king_sq: square of the king to look out from
+        white: True if the king is white
+        pins: signed buffer with room for MAX_PINS entries
+        checks: signed buffer with room for MAX_CHECKS entries
+
+    Returns:
+        Tuple[int, int]: number of pins and number of checks written
+    """
+    own_king = KING if white else KING + 6
+    enemy_knight = KNIGHT + 6 if white else KNIGHT
+    n_pins = 0
+    n_checks = 0
+
+    for i in range(8):
+        delta = PIN_DELTA[i]
+        pin_sq = -1
+        end_sq = king_sq
+        # walk the precomputed ray, it already stops at the board edge
+        for j in range(1, RAY_LENGTH[king_sq * 8 + i] + 1):
+            end_sq += delta
+            code = board[end_sq]
+            if is_own(code, white):
+                if code != own_king:
+                    if pin_sq >= 0:  # second own piece, no pin or check possible
+                        break
+                    pin_sq = end_sq
+            elif code != EMPTY:
+                if ATTACK_MASKS[i * 2 + (j > 1)] & CODE_ATTACKER[code]:
+                    if pin_sq < 0:  # nothing in between, so check
+                        k = n_checks * 4
+                        checks[k] = end_sq >> 3
+                        checks[k + 1] = end_sq & 7
+                        checks[k + 2] = PIN_DR[i]
+                        checks[k + 3] = PIN_DC[i]
+                        n_checks += 1
+                    else:  # one own piece in between, so pin
+                        k = n_pins * 4
+                        pins[k] = pin_sq >> 3
+                        pins[k + 1] = pin_sq & 7
+                        pins[k + 2] = PIN_DR[i]
+                        pins[k + 3] = PIN_DC[i]
+                        n_pins += 1
+                break
+
+    # knight checks, from the precomputed jump targets
+    for i in range(8):
+        end_sq = KNIGHT_TARGETS[king_sq * 8 + i]
+        if end_sq >= 0 and board[end_sq] == enemy_knight:
+            k = n_checks * 4
+            checks[k] = end_sq >> 3
+            checks[k + 1] = end_sq & 7
+            checks[k + 2] = KNIGHT_CHECK_DR[i]
+            checks[k + 3] = KNIGHT_CHECK_DC[i]
+            n_checks += 1
+    return n_pins, n_checks
+
+@njit(cache=True)
+def is_square_attacked(board, sq: int, white: bool) -> bool:
+    """Whether a king of the given color standing on sq would be in check
+
+    Same rays and knight jumps as find_pins_and_checks, but it stops at the
+    first attacker and keeps no pins, so trying out king moves and castling
+    squares does no more work than it has to. The side's own king is looked
+    through like there.
+
+    Args:
+        board: 64 flat board codes
+        sq: square to test
+        white: True if the king is white
+
+    Returns:
+        bool: True if an enemy piece attacks sq
+    """
+    own_king = KING if white else KING + 6
+    enemy_knight = KNIGHT + 6 if white else KNIGHT
+
+    # knight jumps first, they're the cheapest to test
+    for i in range(8):
+        end_sq = KNIGHT_TARGETS[sq * 8 + i]
+        if end_sq >= 0 and board[end_sq] == enemy_knight:
+            return True
+
+    for i in range(8):
+        delta = PIN_DELTA[i]
+        end_sq = sq
+        for j in range(1, RAY_LENGTH[sq * 8 + i] + 1):
+            end_sq += delta
+            code = board[end_sq]
+            if code == EMPTY or code == own_king:
+                continue
+            if is_own(code, white):  # own piece blocks the ray
+                break
+            if ATTACK_MASKS[i * 2 + (j > 1)] & CODE_ATTACKER[code]:
+                return True
+            break
+    return False
+
+def board_to_flat(board) -> bytearray:
+    """Convert an 8x8 board of piece strings into the flat board the kernels read
+
+    Args:
+        board: anything indexable as board[row][col] giving piece codes like "wK" or "--"
+
+    Returns:
+        bytearray: 64 flat board codes, index row * 8 + col
+    """
+    return bytearray(FLAT_CODES[board[r][c]] for r in range(8) for c in range(8))
+
+def unpack_move(packed: int) -> Tuple[int, int, int, int, int, int]:
+    """Split a packed move into (from, to, flags, promo, captured, moved)"""
+    return (packed & 63, (packed >> 6) & 63, (packed >> 12) & 15,
+            (packed >> 16) & 15, (packed >> 20) & 15, packed >> 24)